@@ -1,14 +1,34 @@
-import streamlit as st
-import re
+import contextlib
+import functools
+import hashlib
+import io
+import itertools
+import os
+import pathlib
+import pickle
+import sys
+import time
 
+import streamlit as st
 
-def clean_id(text):
-    """Clean text to create valid Mermaid IDs"""
-    return re.sub(r'[^a-zA-Z0-9]', '', text)
+from c4model import SYSTEM_TYPES, ModelStore, dump_model
+from diagrams import DiagramCache, generate_focus_code, generate_mermaid_code, iter_diagram_items, iter_focus_items
+from export import ExportJob
+from history import History, describe
+from instrumentation import METRICS
+from integrity import IntegrityMonitor
+from model_io import FORMATS, export_to_string, format_from_filename, import_stream
+from persistence import SQLiteRepository
+from scanner import ScanCache, plan_scan, scan_tree
+from search import SearchIndex
+from sessions import SessionMemoryManager, SessionSlot, estimated_bytes
+from svg_renderer import SvgCache, render_svg
 
 
 def main():
     st.set_page_config(page_title="C4 Model Diagram Generator", layout="wide")
+    diagnostics = diagnostics_enabled()
+    start = time.perf_counter()
 
     st.title("C4 Model Diagram Generator")
     st.markdown("""
@@ -19,44 +39,216 @@ def main():
     # Initialize session state variables if they don't exist
     if 'step' not in st.session_state:
         st.session_state.step = 1
-    if 'systems' not in st.session_state:
-        st.session_state.systems = []
-    if 'containers' not in st.session_state:
-        st.session_state.containers = {}
-    if 'components' not in st.session_state:
-        st.session_state.components = {}
-    if 'persons' not in st.session_state:
-        st.session_state.persons = []
-    if 'relationships' not in st.session_state:
-        st.session_state.relationships = []
-
-    # Sidebar for navigation
-    with st.sidebar:
-        st.header("Navigation")
-        if st.button("1. Context Diagram"):
-            st.session_state.step = 1
-        if st.button("2. Container Diagram"):
-            st.session_state.step = 2
-        if st.button("3. Component Diagram"):
-            st.session_state.step = 3
-        if st.button("4. Relationships"):
-            st.session_state.step = 4
-        if st.button("5. Generate Diagram"):
-            st.session_state.step = 5
-
-    # Main area based on current step
-    if st.session_state.step == 1:
-        context_diagram()
-    elif st.session_state.step == 2:
-        container_diagram()
-    elif st.session_state.step == 3:
-        component_diagram()
-    elif st.session_state.step == 4:
-        relationships()
-    elif st.session_state.step == 5:
-        generate_diagram()
-
+    if 'model_slot' not in st.session_state:
+        st.session_state.model_slot = SessionSlot(open_session_model())
+    if 'diagram_cache' not in st.session_state:
+        st.session_state.diagram_cache = DiagramCache()
+
+    # The model stays in memory for the whole run, however long it takes
+    with get_session_manager().in_use(st.session_state.model_slot):
+        # Sidebar for navigation
+        with st.sidebar:
+            st.header("Navigation")
+            if st.button("1. Context Diagram"):
+                st.session_state.step = 1
+            if st.button("2. Container Diagram"):
+                st.session_state.step = 2
+            if st.button("3. Component Diagram"):
+                st.session_state.step = 3
+            if st.button("4. Relationships"):
+                st.session_state.step = 4
+            if st.button("5. Generate Diagram"):
+                st.session_state.step = 5
+            history_controls()
+            integrity_report()
+            st.checkbox("Show diagnostics", key="diagnostics")
+
+        # Main area based on current step
+        if st.session_state.step == 1:
+            context_diagram()
+        elif st.session_state.step == 2:
+            container_diagram()
+        elif st.session_state.step == 3:
+            component_diagram()
+        elif st.session_state.step == 4:
+            relationships()
+        elif st.session_state.step == 5:
+            generate_diagram()
+
+    if diagnostics:
+        METRICS.observe("main", time.perf_counter() - start)
+        diagnostics_panel()
+
+
+@st.cache_resource
+def get_repository(path):
+    """One repository, and so one connection pool, per database file for the whole server"""
+    return SQLiteRepository(path)
+
+
+def open_session_model():
+    """The model named by C4_MODEL in the C4_DATABASE file, or an in-memory model when unset"""
+    path = os.environ.get("C4_DATABASE")
+    if not path:
+        return ModelStore()
+    return get_repository(path).open_model(os.environ.get("C4_MODEL", "default"))
+
+
+@st.cache_resource
+def get_session_manager():
+    """Memory budget shared by all sessions, C4_SESSION_MEMORY_MB (default 512)
+
+    Models of sessions idle for C4_SESSION_IDLE_SECONDS (default 30) are
+    spilled to C4_SPILL_DIR, a temporary directory by default.
+    """
+    budget = float(os.environ.get("C4_SESSION_MEMORY_MB", "512")) * 1024 * 1024
+    min_idle = float(os.environ.get("C4_SESSION_IDLE_SECONDS", "30"))
+    return SessionMemoryManager(int(budget), os.environ.get("C4_SPILL_DIR"), min_idle)
+
+
+def session_model():
+    """This session's model, restored from disk if it was spilled while idle"""
+    slot = st.session_state.model_slot
+    model = get_session_manager().model(slot)
+    # The undo history is recorded from the first access; a spill starts it afresh
+    if "history" not in slot.derived:
+        slot.derived["history"] = History(model)
+    if "integrity" not in slot.derived:
+        slot.derived["integrity"] = IntegrityMonitor(model)
+    return model
+
+
+def holds_session_model(fn):
+    """Keep the session's model from being spilled while a fragment reruns on its own"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with get_session_manager().in_use(st.session_state.model_slot):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def history_controls():
+    """Sidebar undo/redo of the last N changes"""
+    session_model()
+    history = st.session_state.model_slot.derived["history"]
+    st.header("History")
+    steps = st.number_input("Steps", min_value=1, max_value=history.limit, value=1, step=1, key="history_steps")
+    col1, col2 = st.columns(2)
+    error = None
+    with col1:
+        if st.button("Undo", key="undo", disabled=not history.can_undo):
+            try:
+                history.undo(steps)
+            except ValueError as e:
+                error = f"Nothing was undone. {e}"
+    with col2:
+        if st.button("Redo", key="redo", disabled=not history.can_redo):
+            try:
+                history.redo(steps)
+            except ValueError as e:
+                error = f"Nothing was redone. {e}"
+    if error:
+        st.error(error)
+    if history.can_undo:
+        st.caption("Last change: " + describe(history.undo_stack[-1]))
+
+
+INTEGRITY_LIST_LIMIT = 20
+
+
+def integrity_report():
+    """Sidebar list of the model's integrity problems, kept current by the monitor"""
+    session_model()
+    monitor = st.session_state.model_slot.derived["integrity"]
+    st.header("Integrity")
+    if not monitor:
+        st.caption("No problems found.")
+        return
+    st.warning(f"{len(monitor)} problem{'s' if len(monitor) != 1 else ''} found.")
+    with st.expander("Details"):
+        for message in monitor.messages(INTEGRITY_LIST_LIMIT):
+            st.markdown(f"- {message}")
+        if len(monitor) > INTEGRITY_LIST_LIMIT:
+            st.caption(f"... and {len(monitor) - INTEGRITY_LIST_LIMIT} more")
+
+
+def diagnostics_enabled():
+    """Instrumentation is opt-in, per session or for the whole server via C4_DIAGNOSTICS=1"""
+    return os.environ.get("C4_DIAGNOSTICS") == "1" or st.session_state.get("diagnostics", False)
+
+
+def diagnostics_timer(name):
+    return METRICS.timer(name) if diagnostics_enabled() else contextlib.nullcontext()
+
+
+def timed(name):
+    """Record the run time of a step or fragment function while diagnostics are enabled"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with diagnostics_timer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def session_state_bytes():
+    """Size of the session state, recomputed only when the model changes
+
+    The model is counted with the memory manager's estimate, since a stored
+    model holds database connections and cannot be pickled; everything else
+    by its pickled size.
+    """
+    model = session_model()
+    cached = st.session_state.get("_state_size")
+    if cached and cached[0] == model.version:
+        return cached[1]
+    size = estimated_bytes(model)
+    for key in list(st.session_state.keys()):
+        if key == "model_slot":
+            continue
+        value = st.session_state[key]
+        try:
+            size += len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # Objects holding threads or files, such as a running export
+            size += sys.getsizeof(value)
+    st.session_state["_state_size"] = (model.version, size)
+    return size
+
+
+def diagnostics_panel():
+    """Sidebar panel with rolling timings and state size; also writes the metrics file"""
+    model = session_model()
+    cache = st.session_state.diagram_cache
+    METRICS.set_gauge("session_state_bytes", session_state_bytes())
+    METRICS.set_gauge("model_elements", len(model.elements))
+    METRICS.set_gauge("model_relationships", len(model.relationships))
+    METRICS.set_gauge("diagram_cache_hits", cache.hits)
+    METRICS.set_gauge("diagram_cache_misses", cache.misses)
 
+    with st.sidebar:
+        st.header("Diagnostics")
+        st.dataframe([
+            {"Section": name, "p50 (ms)": round(p50 * 1000, 2), "p95 (ms)": round(p95 * 1000, 2), "Runs": count}
+            for name, (p50, p95, count) in sorted(METRICS.summary().items())
+        ], hide_index=True)
+        gauges = METRICS.gauges()
+        st.caption(f"Session state: {gauges['session_state_bytes'] / 1024:.1f} KiB, "
+                   f"{gauges['model_elements']} elements, {gauges['model_relationships']} relationships")
+        manager = get_session_manager()
+        st.caption(f"Session models: {gauges.get('session_resident_bytes', 0) / 1024 ** 2:.1f} of "
+                   f"{manager.budget_bytes / 1024 ** 2:.0f} MiB in memory, "
+                   f"{manager.spills} spills, {manager.restores} restores")
+
+    path = os.environ.get("C4_METRICS_FILE", "c4_metrics.prom")
+    try:
+        METRICS.write_prometheus(path)
+    except OSError as e:
+        st.sidebar.warning(f"Could not write metrics to {path}: {e}")
+
+
+@timed("context_diagram")
 def context_diagram():
     st.header("Step 1: Context Diagram")
     st.markdown("""
@@ -64,55 +256,76 @@ def context_diagram():
     The context diagram shows the big picture of your system and how it interacts with users and external systems.
     """)
 
+    # Systems and persons are separate fragments so adding one does not rerun the page
+    systems_section()
+    persons_section()
+
+    bulk_import_export()
+
+    # Navigation
+    col1, col2 = st.columns(2)
+    with col2:
+        if st.button("Next: Container Diagram", key="next_to_containers"):
+            st.session_state.step = 2
+            st.rerun()
+
+
+@st.fragment
+@timed("systems_section")
+@holds_session_model
+def systems_section():
+    """Systems list and form; a change reruns only this fragment"""
+    model = session_model()
+
     # Systems
     st.subheader("Systems")
     st.markdown("Define the software systems in your enterprise architecture.")
 
     # Display existing systems
-    if st.session_state.systems:
+    if model.count("system"):
         st.write("Current Systems:")
-        for i, system in enumerate(st.session_state.systems):
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.write(f"{i + 1}. {system['name']} - {system['description']}")
-            with col2:
-                if st.button(f"Remove System {i + 1}"):
-                    st.session_state.systems.pop(i)
-                    st.rerun()
+        element_table("systems", model.by_kind["system"], {
+            "name": st.column_config.TextColumn("Name"),
+            "description": st.column_config.TextColumn("Description"),
+            "type": st.column_config.SelectboxColumn("Type", options=list(SYSTEM_TYPES), required=True),
+        }, editable=("description", "type"))
 
     # Add new system
     with st.form("add_system_form"):
         st.write("Add a new system:")
         system_name = st.text_input("System Name")
         system_description = st.text_area("System Description")
-        system_type = st.selectbox("System Type", ["Internal", "External"])
+        system_type = st.selectbox("System Type", SYSTEM_TYPES)
         submit_system = st.form_submit_button("Add System")
 
         if submit_system and system_name and system_description:
-            st.session_state.systems.append({
-                "name": system_name,
-                "description": system_description,
-                "type": system_type,
-                "id": clean_id(system_name)
-            })
-            st.success(f"System '{system_name}' added successfully!")
-            st.rerun()
+            try:
+                model.add_system(system_name, system_description, system_type)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"System '{system_name}' added successfully!")
+                rerun_fragment()
+
+
+@st.fragment
+@timed("persons_section")
+@holds_session_model
+def persons_section():
+    """Persons list and form; a change reruns only this fragment"""
+    model = session_model()
 
     # Persons
     st.subheader("Persons (Users)")
     st.markdown("Define the users or actors that interact with your systems.")
 
     # Display existing persons
-    if st.session_state.persons:
+    if model.count("person"):
         st.write("Current Persons:")
-        for i, person in enumerate(st.session_state.persons):
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.write(f"{i + 1}. {person['name']} - {person['description']}")
-            with col2:
-                if st.button(f"Remove Person {i + 1}"):
-                    st.session_state.persons.pop(i)
-                    st.rerun()
+        element_table("persons", model.by_kind["person"], {
+            "name": st.column_config.TextColumn("Name"),
+            "description": st.column_config.TextColumn("Description"),
+        }, editable=("description",))
 
     # Add new person
     with st.form("add_person_form"):
@@ -122,30 +335,168 @@ def context_diagram():
         submit_person = st.form_submit_button("Add Person")
 
         if submit_person and person_name and person_description:
-            st.session_state.persons.append({
-                "name": person_name,
-                "description": person_description,
-                "id": clean_id(person_name)
-            })
-            st.success(f"Person '{person_name}' added successfully!")
-            st.rerun()
+            try:
+                model.add_person(person_name, person_description)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"Person '{person_name}' added successfully!")
+                rerun_fragment()
 
-    # Navigation
-    col1, col2 = st.columns(2)
+
+def rerun_fragment():
+    """Rerun only the calling fragment, or the whole app when not in a fragment rerun"""
+    try:
+        st.rerun(scope="fragment")
+    except st.errors.StreamlitAPIException:
+        st.rerun()
+
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+
+def paged_table(key, index, to_row, column_config, editable):
+    """Show one page of an ordered id index as an editable table
+
+    Only the rows of the current page are built and rendered, so the cost
+    follows the page size rather than the model size. Rows can be edited in
+    the ``editable`` columns and ticked for deletion; the edits are returned
+    as ``(updates, deletes)`` when "Apply Changes" is pressed, else ``None``.
+    """
+    total = len(index)
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+    pages = max(1, -(-total // page_size))
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
     with col2:
-        if st.button("Next: Container Diagram", key="next_to_containers"):
-            st.session_state.step = 2
-            st.rerun()
+        page = st.number_input("Page", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+    with col3:
+        st.caption(f"{total} in total, page {page} of {pages}")
+
+    start = (page - 1) * page_size
+    ids = list(itertools.islice(index, start, start + page_size))
+    rows = [dict(to_row(item_id), delete=False) for item_id in ids]
+    column_config = dict(column_config, delete=st.column_config.CheckboxColumn("Delete"))
+    disabled = [field for field in column_config if field not in editable and field != "delete"]
+    edited = st.data_editor(
+        rows,
+        key=f"{key}_editor_{session_model().version}_{page}_{page_size}",
+        column_config=column_config,
+        disabled=disabled,
+        hide_index=True,
+    )
 
+    if not st.button("Apply Changes", key=f"{key}_apply"):
+        return None
+    updates = {}
+    deletes = []
+    for item_id, row, edited_row in zip(ids, rows, edited):
+        if edited_row["delete"]:
+            deletes.append(item_id)
+            continue
+        changed = {field: edited_row[field] if edited_row[field] is not None else ""
+                   for field in editable if edited_row[field] != row[field]}
+        if changed:
+            updates[item_id] = changed
+    return updates, deletes
+
+
+def element_table(key, index, column_config, editable):
+    """Paged, editable table of model elements; applies the edits as one batch"""
+    model = session_model()
+    edits = paged_table(key, index, lambda element_id: {
+        field: getattr(model.elements[element_id], field) for field in column_config
+    }, column_config, editable)
+    cascade = st.checkbox("Deleting also removes nested elements and relationships", key=f"{key}_cascade")
+    if edits:
+        updates, deletes = edits
+        # Check every deletion before changing anything, so a refused one leaves the table as it was
+        blocked = [] if cascade else [element_id for element_id in deletes
+                                      if sum(map(len, model.dependents(element_id))) > 1]
+        if blocked:
+            st.error("Not deleted, still in use: " + ", ".join(model.label(element_id) for element_id in blocked)
+                     + ". Tick the box below the table to delete them with everything they contain.")
+            return
+        try:
+            with model.batch():
+                for element_id, fields in updates.items():
+                    model.update_element(element_id, **fields)
+                for element_id in deletes:
+                    model.remove(element_id, cascade=cascade)
+        except ValueError as e:
+            st.error(f"No changes were applied. {e}")
+            return
+        rerun_fragment()
+
+
+def bulk_import_export():
+    """Load many elements from a file in one batch, or export the whole model"""
+    model = session_model()
+
+    with st.expander("Bulk Import / Export"):
+        st.markdown("Import persons, systems, containers, components and relationships from a "
+                    "JSON, JSON Lines, YAML or CSV file. The whole file is validated before anything is added.")
+        uploaded = st.file_uploader("Model file", type=["json", "jsonl", "ndjson", "yaml", "yml", "csv"])
+        replace = st.checkbox("Replace the current model instead of adding to it")
+        if uploaded is not None and st.button("Import", key="bulk_import"):
+            target = ModelStore() if replace else model
+            try:
+                fmt = format_from_filename(uploaded.name)
+            except ValueError as e:
+                st.error(str(e))
+                return
+            # Ids and parents are checked against the whole model, not just the loaded part of a stored one
+            target.ensure_all_loaded()
+            plan = import_stream(io.TextIOWrapper(uploaded, encoding="utf-8", newline=""), fmt, target)
+            if plan.errors:
+                st.error(f"Import failed with {len(plan.errors)} errors; nothing was added.")
+                st.write("\n".join(f"- {error}" for error in plan.errors[:50]))
+            else:
+                try:
+                    with target.batch():
+                        plan.apply(target)
+                except ValueError as e:
+                    st.error(f"Import failed; nothing was added. {e}")
+                    return
+                if replace:
+                    if model.loader is not None:
+                        # A stored model is overwritten in one transaction
+                        target = model.loader.repository.replace_model(model.loader.model_name, target)
+                    st.session_state.model_slot = SessionSlot(target)
+                # An addition stays in the session's slot, so its history can undo the import
+                st.rerun()
 
+        export_format = st.selectbox("Export format", FORMATS)
+        cache = st.session_state.diagram_cache
+        export_key = (model.version, f"Export {export_format}", None, None)
+        exported = cache.get(export_key)
+        if exported is None:
+            # A lazily loaded model is read in full only when an export is asked for
+            if model.loader is not None and not st.button("Prepare Export", key="prepare_export"):
+                return
+            model.ensure_all_loaded()
+            exported = export_to_string(model, export_format)
+            cache.put((model.version, f"Export {export_format}", None, None), exported)
+        st.download_button(
+            label="Export Model",
+            data=exported,
+            file_name=f"c4_model.{export_format}",
+            mime="text/plain"
+        )
+
+
+@timed("container_diagram")
 def container_diagram():
     st.header("Step 2: Container Diagram")
     st.markdown("""
     Define containers for each system. Containers are runtime units (applications, data stores, etc.) 
     that make up a system.
     """)
+    model = session_model()
 
-    if not st.session_state.systems:
+    if not model.count("system"):
         st.warning("Please add at least one system in the Context Diagram step before proceeding.")
         if st.button("Go back to Context Diagram"):
             st.session_state.step = 1
@@ -153,32 +504,99 @@ def container_diagram():
         return
 
     # Select system
-    system_names = [system["name"] for system in st.session_state.systems if system["type"] == "Internal"]
-    if not system_names:
+    system_ids = [system.id for system in model.systems(internal_only=True)]
+    if not system_ids:
         st.warning("You need at least one internal system to define containers.")
         if st.button("Go back to Context Diagram"):
             st.session_state.step = 1
             st.rerun()
         return
 
-    selected_system = st.selectbox("Select System", system_names)
-    system_id = clean_id(selected_system)
+    system_id = st.selectbox("Select System", system_ids, format_func=lambda eid: model.get(eid).name)
+    model.ensure_loaded(system_id)
+
+    # The container list and form rerun on their own as a fragment
+    containers_section(system_id)
+    source_import(system_id)
+
+    # Navigation
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("Previous: Context Diagram", key="prev_to_context"):
+            st.session_state.step = 1
+            st.rerun()
+    with col3:
+        if st.button("Next: Component Diagram", key="next_to_components"):
+            st.session_state.step = 3
+            st.rerun()
+
+
+@st.cache_resource
+def get_scan_cache(root):
+    """Parse results for one source tree, shared by all sessions, in C4_SCAN_CACHE_DIR (default .c4_scan_cache)"""
+    name = hashlib.sha256(os.path.abspath(root).encode("utf-8")).hexdigest()[:16]
+    return ScanCache(os.path.join(os.environ.get("C4_SCAN_CACHE_DIR", ".c4_scan_cache"), f"{name}.json"))
+
+
+def source_import(system_id):
+    """Containers, components and relationships of the system read from a Python source tree"""
+    model = session_model()
+    with st.expander("Import from Source Code"):
+        st.markdown("Scan a local Python source tree: each package becomes a container, each module a "
+                    "component and each import between them a relationship. What the model already has is "
+                    "kept, so scanning again only adds what is new.")
+        root = st.text_input("Source directory", key="scan_root")
+        report = st.session_state.pop("scan_report", None)
+        if report:
+            st.success(report)
+        if not root or not st.button("Scan and Import", key="scan_import"):
+            return
+        if not os.path.isdir(root):
+            st.error(f"'{root}' is not a directory.")
+            return
+        # Existing elements and relationships are only skipped if they are in memory
+        model.ensure_loaded(system_id, deep=True)
+        with diagnostics_timer("scan"):
+            scan = scan_tree(root, get_scan_cache(root))
+        plan, skipped = plan_scan(scan, model, system_id)
+        skipped = scan.errors + skipped
+        summary = (f"Scanned {scan.files} files ({scan.parsed} parsed, {scan.files - scan.parsed} unchanged) "
+                   f"in {scan.seconds:.2f} s, {scan.files_per_second:,.0f} files/s"
+                   + (f", {len(skipped)} skipped." if skipped else "."))
+        if skipped:
+            st.warning(f"{len(skipped)} files or modules were skipped.")
+            st.write("\n".join(f"- {error}" for error in skipped[:50]))
+        if plan.errors:
+            st.error(f"Import failed with {len(plan.errors)} errors; nothing was added. {summary}")
+            st.write("\n".join(f"- {error}" for error in plan.errors[:50]))
+            return
+        try:
+            with model.batch():
+                plan.apply(model)
+        except ValueError as e:
+            st.error(f"Import failed; nothing was added. {e}")
+            return
+        st.session_state.scan_report = (f"{summary} Added {plan.element_count} elements and "
+                                        f"{len(plan.relationships)} relationships.")
+        st.rerun()
 
-    if system_id not in st.session_state.containers:
-        st.session_state.containers[system_id] = []
+
+@st.fragment
+@timed("containers_section")
+@holds_session_model
+def containers_section(system_id):
+    """Containers of one system; a change reruns only this fragment"""
+    model = session_model()
+    selected_system = model.get(system_id).name
 
     # Display existing containers
-    if st.session_state.containers[system_id]:
+    if model.children.get(system_id):
         st.write(f"Current Containers for {selected_system}:")
-        for i, container in enumerate(st.session_state.containers[system_id]):
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.write(
-                    f"{i + 1}. {container['name']} - {container['description']} (Technology: {container['technology']})")
-            with col2:
-                if st.button(f"Remove Container {i + 1}"):
-                    st.session_state.containers[system_id].pop(i)
-                    st.rerun()
+        element_table(f"containers_{system_id}", model.children[system_id], {
+            "name": st.column_config.TextColumn("Name"),
+            "description": st.column_config.TextColumn("Description"),
+            "technology": st.column_config.TextColumn("Technology"),
+        }, editable=("description", "technology"))
 
     # Add new container
     with st.form(f"add_container_form_{system_id}"):
@@ -189,42 +607,27 @@ def container_diagram():
         submit_container = st.form_submit_button("Add Container")
 
         if submit_container and container_name and container_description:
-            st.session_state.containers[system_id].append({
-                "name": container_name,
-                "description": container_description,
-                "technology": container_technology,
-                "id": f"{system_id}_{clean_id(container_name)}"
-            })
-            st.success(f"Container '{container_name}' added to '{selected_system}' successfully!")
-            st.rerun()
-
-    # Navigation
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        if st.button("Previous: Context Diagram", key="prev_to_context"):
-            st.session_state.step = 1
-            st.rerun()
-    with col3:
-        if st.button("Next: Component Diagram", key="next_to_components"):
-            st.session_state.step = 3
-            st.rerun()
+            try:
+                model.add_container(system_id, container_name, container_description, container_technology)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"Container '{container_name}' added to '{selected_system}' successfully!")
+                rerun_fragment()
 
 
+@timed("component_diagram")
 def component_diagram():
     st.header("Step 3: Component Diagram")
     st.markdown("""
     Define components for each container. Components are grouped chunks of code 
     (modules, packages, etc.) within a container.
     """)
+    model = session_model()
 
-    # Check if containers exist
-    has_containers = False
-    for system_id, containers in st.session_state.containers.items():
-        if containers:
-            has_containers = True
-            break
-
-    if not has_containers:
+    # Check if containers can exist; a stored model loads them per system below
+    system_ids = [system.id for system in model.systems(internal_only=True)]
+    if not system_ids or (model.loader is None and not model.count("container")):
         st.warning("Please add at least one container in the Container Diagram step before proceeding.")
         if st.button("Go back to Container Diagram"):
             st.session_state.step = 2
@@ -232,11 +635,12 @@ def component_diagram():
         return
 
     # Select system
-    system_names = [system["name"] for system in st.session_state.systems if system["type"] == "Internal"]
-    selected_system = st.selectbox("Select System", system_names)
-    system_id = clean_id(selected_system)
+    system_id = st.selectbox("Select System", system_ids, format_func=lambda eid: model.get(eid).name)
+    selected_system = model.get(system_id).name
+    model.ensure_loaded(system_id)
 
-    if system_id not in st.session_state.containers or not st.session_state.containers[system_id]:
+    container_ids = [container.id for container in model.containers(system_id)]
+    if not container_ids:
         st.warning(f"No containers defined for {selected_system}. Please add containers first.")
         if st.button("Go back to Container Diagram"):
             st.session_state.step = 2
@@ -244,25 +648,40 @@ def component_diagram():
         return
 
     # Select container
-    container_names = [container["name"] for container in st.session_state.containers[system_id]]
-    selected_container = st.selectbox("Select Container", container_names)
-    container_id = f"{system_id}_{clean_id(selected_container)}"
+    container_id = st.selectbox("Select Container", container_ids, format_func=lambda eid: model.get(eid).name)
+    model.ensure_loaded(container_id)
 
-    if container_id not in st.session_state.components:
-        st.session_state.components[container_id] = []
+    # The component list and form rerun on their own as a fragment
+    components_section(container_id)
+
+    # Navigation
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("Previous: Container Diagram", key="prev_to_containers"):
+            st.session_state.step = 2
+            st.rerun()
+    with col3:
+        if st.button("Next: Relationships", key="next_to_relationships"):
+            st.session_state.step = 4
+            st.rerun()
+
+
+@st.fragment
+@timed("components_section")
+@holds_session_model
+def components_section(container_id):
+    """Components of one container; a change reruns only this fragment"""
+    model = session_model()
+    selected_container = model.get(container_id).name
 
     # Display existing components
-    if st.session_state.components[container_id]:
+    if model.children.get(container_id):
         st.write(f"Current Components for {selected_container}:")
-        for i, component in enumerate(st.session_state.components[container_id]):
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.write(
-                    f"{i + 1}. {component['name']} - {component['description']} (Technology: {component['technology']})")
-            with col2:
-                if st.button(f"Remove Component {i + 1}"):
-                    st.session_state.components[container_id].pop(i)
-                    st.rerun()
+        element_table(f"components_{container_id}", model.children[container_id], {
+            "name": st.column_config.TextColumn("Name"),
+            "description": st.column_config.TextColumn("Description"),
+            "technology": st.column_config.TextColumn("Technology"),
+        }, editable=("description", "technology"))
 
     # Add new component
     with st.form(f"add_component_form_{container_id}"):
@@ -273,152 +692,245 @@ def component_diagram():
         submit_component = st.form_submit_button("Add Component")
 
         if submit_component and component_name and component_description:
-            st.session_state.components[container_id].append({
-                "name": component_name,
-                "description": component_description,
-                "technology": component_technology,
-                "id": f"{container_id}_{clean_id(component_name)}"
-            })
-            st.success(f"Component '{component_name}' added to '{selected_container}' successfully!")
-            st.rerun()
+            try:
+                model.add_component(container_id, component_name, component_description, component_technology)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.success(f"Component '{component_name}' added to '{selected_container}' successfully!")
+                rerun_fragment()
+
+
+@timed("relationships")
+def relationships():
+    st.header("Step 4: Relationships")
+    st.markdown("""
+    Define relationships between elements in your C4 model. 
+    Relationships show how different parts of your architecture interact with each other.
+    """)
+
+    # Adding or editing a relationship reruns only this fragment
+    relationships_section()
 
     # Navigation
     col1, col2, col3 = st.columns(3)
     with col1:
-        if st.button("Previous: Container Diagram", key="prev_to_containers"):
-            st.session_state.step = 2
+        if st.button("Previous: Component Diagram", key="prev_to_components"):
+            st.session_state.step = 3
             st.rerun()
     with col3:
-        if st.button("Next: Relationships", key="next_to_relationships"):
-            st.session_state.step = 4
+        if st.button("Next: Generate Diagram", key="next_to_generate"):
+            st.session_state.step = 5
             st.rerun()
 
 
-def relationships():
-    st.header("Step 4: Relationships")
-    st.markdown("""
-    Define relationships between elements in your C4 model. 
-    Relationships show how different parts of your architecture interact with each other.
-    """)
+PICKER_LIMIT = 100
+
+
+def element_search_index():
+    """Search index over the element names, rebuilt only when the model changes"""
+    model = session_model()
+    derived = st.session_state.model_slot.derived
+    index = derived.get("search_index")
+    if index is None or index.version != model.version:
+        index = SearchIndex(model)
+        derived["search_index"] = index
+    return index
+
+
+@st.fragment
+@timed("relationships_section")
+@holds_session_model
+def relationships_section():
+    """Relationship list and form; a change reruns only this fragment"""
+    model = session_model()
 
     # Display existing relationships
-    if st.session_state.relationships:
+    if model.relationships:
         st.subheader("Current Relationships:")
-        for i, rel in enumerate(st.session_state.relationships):
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                st.write(f"{i + 1}. {rel['source_name']} → {rel['target_name']}: {rel['description']}")
-            with col2:
-                if st.button(f"Remove Relationship {i + 1}"):
-                    st.session_state.relationships.pop(i)
-                    st.rerun()
+        edits = paged_table("relationships", model.relationships, lambda rel_id: {
+            "source": model.label(model.relationships[rel_id].source_id),
+            "target": model.label(model.relationships[rel_id].target_id),
+            "description": model.relationships[rel_id].description,
+        }, {
+            "source": st.column_config.TextColumn("Source"),
+            "target": st.column_config.TextColumn("Target"),
+            "description": st.column_config.TextColumn("Description"),
+        }, editable=("description",))
+        if edits:
+            updates, deletes = edits
+            try:
+                with model.batch():
+                    for rel_id, fields in updates.items():
+                        model.update_relationship(rel_id, fields["description"])
+                    for rel_id in deletes:
+                        model.remove_relationship(rel_id)
+            except ValueError as e:
+                st.error(f"No changes were applied. {e}")
+            else:
+                rerun_fragment()
 
     # Add new relationship
     st.subheader("Add a new relationship:")
+    # The search boxes sit outside the form so the pickers update as you type
+    index = element_search_index()
+    col1, col2 = st.columns(2)
+    with col1:
+        source_query = st.text_input("Search sources", placeholder="Name or type, e.g. 'container order'")
+    with col2:
+        target_query = st.text_input("Search targets", placeholder="Name or type, e.g. 'system payments'")
+    source_ids = index.search(source_query, limit=PICKER_LIMIT)
+    target_ids = index.search(target_query, limit=PICKER_LIMIT)
+    st.caption(f"Showing up to {PICKER_LIMIT} matches out of {len(index)} elements.")
+
     with st.form("add_relationship_form"):
-        # Prepare options for sources and targets
-        source_options = []
-        # Add persons
-        for person in st.session_state.persons:
-            source_options.append({
-                "name": f"Person: {person['name']}",
-                "id": person['id'],
-                "type": "person"
-            })
-        # Add systems
-        for system in st.session_state.systems:
-            source_options.append({
-                "name": f"System: {system['name']}",
-                "id": system['id'],
-                "type": "system"
-            })
-        # Add containers
-        for system_id, containers in st.session_state.containers.items():
-            for container in containers:
-                source_options.append({
-                    "name": f"Container: {container['name']}",
-                    "id": container['id'],
-                    "type": "container"
-                })
-        # Add components
-        for container_id, components in st.session_state.components.items():
-            for component in components:
-                source_options.append({
-                    "name": f"Component: {component['name']}",
-                    "id": component['id'],
-                    "type": "component"
-                })
-
-        source_names = [option["name"] for option in source_options]
-        target_names = source_names.copy()
-
-        source_selected = st.selectbox("Source", source_names)
-        target_selected = st.selectbox("Target", target_names)
+        source_id = st.selectbox("Source", source_ids, format_func=model.label)
+        target_id = st.selectbox("Target", target_ids, format_func=model.label)
         relationship_description = st.text_input("Relationship Description (e.g., 'uses', 'sends data to')")
         submit_relationship = st.form_submit_button("Add Relationship")
 
-        if submit_relationship and source_selected and target_selected and relationship_description:
-            source_index = source_names.index(source_selected)
-            target_index = target_names.index(target_selected)
-
-            source = source_options[source_index]
-            target = source_options[target_index]
-
-            if source["id"] != target["id"]:
-                st.session_state.relationships.append({
-                    "source_id": source["id"],
-                    "source_name": source_selected,
-                    "target_id": target["id"],
-                    "target_name": target_selected,
-                    "description": relationship_description
-                })
-                st.success(f"Relationship from '{source_selected}' to '{target_selected}' added successfully!")
-                st.rerun()
+        if submit_relationship and source_id and target_id and relationship_description:
+            try:
+                rel = model.add_relationship(source_id, target_id, relationship_description)
+            except ValueError as e:
+                st.error(str(e))
             else:
-                st.error("Source and target cannot be the same!")
+                st.success(f"Relationship from '{model.label(rel.source_id)}' to '{model.label(rel.target_id)}' "
+                           f"added successfully!")
+                rerun_fragment()
+
+
+FOCUS_MAX_HOPS = 5
+
+
+def export_all():
+    """Build a ZIP of every diagram and the model in the background, then offer it for download"""
+    st.subheader("Export Everything")
+    job = st.session_state.get("export_job")
+    if st.button("Export All Diagrams (ZIP)", disabled=job is not None and job.running):
+        model = session_model()
+        model.ensure_all_loaded()
+        job = ExportJob(model, os.environ.get("C4_EXPORT_DIR"), get_svg_cache()).start()
+        st.session_state.export_job = job
+    if job is None:
+        return
+    if job.running:
+        export_progress()
+    elif job.error is not None:
+        st.error(f"Export failed: {job.error}")
+    else:
+        # The archive is read from disk only when the button is clicked
+        st.download_button(
+            label="Download All (ZIP)",
+            data=pathlib.Path(job.path).read_bytes,
+            file_name="c4_model_export.zip",
+            mime="application/zip"
+        )
+
+
+@st.fragment(run_every=0.5)
+def export_progress():
+    """Progress of the running export; polls on its own and reruns the page when done"""
+    job = st.session_state.export_job
+    if not job.running:
+        st.rerun()
+    st.progress(job.progress, text=f"Exported {job.done} of {job.total or '?'} files")
 
-    # Navigation
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        if st.button("Previous: Component Diagram", key="prev_to_components"):
-            st.session_state.step = 3
-            st.rerun()
-    with col3:
-        if st.button("Next: Generate Diagram", key="next_to_generate"):
-            st.session_state.step = 5
-            st.rerun()
 
+@st.cache_resource
+def get_svg_cache():
+    """Rendered SVGs shared by all sessions, in C4_SVG_CACHE_DIR (default .c4_svg_cache) up to C4_SVG_CACHE_MB"""
+    max_bytes = float(os.environ.get("C4_SVG_CACHE_MB", "256")) * 1024 * 1024
+    return SvgCache(os.environ.get("C4_SVG_CACHE_DIR", ".c4_svg_cache"), int(max_bytes))
 
+
+def diagram_svg(mermaid_code, items):
+    """Path of the SVG for a diagram, rendered from ``items()`` only if no session has yet"""
+    svg_cache = get_svg_cache()
+    path = svg_cache.get(mermaid_code)
+    if path is None:
+        with diagnostics_timer("render_svg"):
+            path = svg_cache.put(mermaid_code, render_svg(items()))
+    if diagnostics_enabled():
+        METRICS.set_gauge("svg_cache_hits", svg_cache.hits)
+        METRICS.set_gauge("svg_cache_misses", svg_cache.misses)
+    return path
+
+
+@timed("generate_diagram")
 def generate_diagram():
     st.header("Step 5: Generate Diagram")
+    model = session_model()
 
-    diagram_type = st.selectbox("Select Diagram Type", ["Context", "Container", "Component"])
-    selected_system = None
-    selected_container = None
+    diagram_type = st.selectbox("Select Diagram Type", ["Context", "Container", "Component", "Focus"])
+    system_id = None
+    container_id = None
+
+    # A focus view shows only the elements a few relationships away from one element
+    if diagram_type == "Focus":
+        focus_query = st.text_input("Search elements", placeholder="Name or type, e.g. 'container order'")
+        focus_ids = element_search_index().search(focus_query, limit=PICKER_LIMIT)
+        if not focus_ids:
+            st.warning("No elements match the search.")
+            return
+        focus_id = st.selectbox("Focus on", focus_ids, format_func=model.label)
+        hops = st.slider("Hops", min_value=1, max_value=FOCUS_MAX_HOPS, value=1)
+
+    if diagram_type == "Context" and model.loader is not None and not model.loader.fully_loaded:
+        # Dependencies rolled up from containers and components need every relationship, so a
+        # stored model is read in full only when asked for, like the exports
+        st.info("The Context diagram rolls up the relationships of every container and component, "
+                "which reads the whole stored model.")
+        if not st.button("Prepare Context Diagram", key="prepare_context"):
+            return
+        model.ensure_all_loaded()
 
     if diagram_type in ["Container", "Component"]:
-        system_names = [system["name"] for system in st.session_state.systems if system["type"] == "Internal"]
-        if system_names:
-            selected_system = st.selectbox("Select System", system_names)
+        system_ids = [system.id for system in model.systems(internal_only=True)]
+        if system_ids:
+            system_id = st.selectbox("Select System", system_ids, format_func=lambda eid: model.get(eid).name)
+            # Container diagrams need the whole subtree, component diagrams one container's
+            model.ensure_loaded(system_id, deep=diagram_type == "Container")
         else:
             st.warning("No internal systems available to generate Container or Component diagrams.")
             return
 
-    if diagram_type == "Component" and selected_system:
-        system_id = clean_id(selected_system)
-        if system_id in st.session_state.containers and st.session_state.containers[system_id]:
-            container_names = [container["name"] for container in st.session_state.containers[system_id]]
-            selected_container = st.selectbox("Select Container", container_names)
+    if diagram_type == "Component" and system_id:
+        container_ids = [container.id for container in model.containers(system_id)]
+        if container_ids:
+            container_id = st.selectbox("Select Container", container_ids,
+                                        format_func=lambda eid: model.get(eid).name)
+            model.ensure_loaded(container_id, deep=True)
         else:
-            st.warning(f"No containers available for {selected_system} to generate Component diagram.")
+            st.warning(f"No containers available for {model.get(system_id).name} to generate Component diagram.")
             return
 
-    # Generate Mermaid diagram
-    mermaid_code = generate_mermaid_code(diagram_type, selected_system, selected_container)
+    # Generate Mermaid diagram, reusing the cached output while the model is unchanged
+    cache = st.session_state.diagram_cache
+    selection = (focus_id, hops) if diagram_type == "Focus" else (system_id, container_id)
+    mermaid_code = cache.get((model.version, diagram_type, *selection))
+    if mermaid_code is None:
+        with diagnostics_timer("generate_mermaid_code"):
+            if diagram_type == "Focus":
+                mermaid_code = generate_focus_code(model, focus_id, hops)
+            else:
+                mermaid_code = generate_mermaid_code(model, diagram_type, system_id, container_id)
+        # Keyed after generating, since a focus view may load more of a stored model
+        cache.put((model.version, diagram_type, *selection), mermaid_code)
 
-    # Display diagram
+    # Display diagram, laid out once on the server or by Mermaid in the browser
     st.subheader("Generated C4 Model Diagram")
-    st.markdown(f"```mermaid\n{mermaid_code}\n```")
+    renderer = st.radio("Render", ["Server (SVG)", "Browser (Mermaid)"], horizontal=True)
+    svg_path = None
+    if renderer == "Server (SVG)":
+        if diagram_type == "Focus":
+            items = functools.partial(iter_focus_items, model, focus_id, hops)
+        else:
+            items = functools.partial(iter_diagram_items, model, diagram_type, system_id, container_id)
+        svg_path = diagram_svg(mermaid_code, items)
+        st.image(svg_path)
+    else:
+        st.markdown(f"```mermaid\n{mermaid_code}\n```")
 
     # Show raw code
     with st.expander("Show Raw Mermaid Code"):
@@ -431,6 +943,30 @@ def generate_diagram():
         file_name="c4_model_diagram.mmd",
         mime="text/plain"
     )
+    if svg_path is not None:
+        with open(svg_path, "rb") as f:
+            st.download_button(
+                label="Download SVG",
+                data=f.read(),
+                file_name="c4_model_diagram.svg",
+                mime="image/svg+xml"
+            )
+    model_key = (model.version, "Model", None, None)
+    model_json = cache.get(model_key)
+    if model_json is None and (model.loader is None or st.button("Prepare Model (JSON)", key="prepare_model_json")):
+        model.ensure_all_loaded()
+        model_json = dump_model(model)
+        cache.put((model.version, "Model", None, None), model_json)
+    if model_json is not None:
+        st.download_button(
+            label="Download Model (JSON)",
+            data=model_json,
+            file_name="c4_model.json",
+            mime="application/json"
+        )
+    st.caption(f"Diagram cache: {cache.hits} hits, {cache.misses} misses, {len(cache)} of {cache.maxsize} entries")
+
+    export_all()
 
     # Navigation
     if st.button("Previous: Relationships", key="prev_to_relationships"):
@@ -438,101 +974,5 @@ def generate_diagram():
         st.rerun()
 
 
-def generate_mermaid_code(diagram_type, selected_system=None, selected_container=None):
-    """Generate Mermaid code based on the data and selected diagram type"""
-    mermaid_code = "C4Context\n"
-
-    # Title based on diagram type
-    if diagram_type == "Context":
-        mermaid_code += "    title Context Diagram\n"
-    elif diagram_type == "Container" and selected_system:
-        mermaid_code += f"    title Container Diagram for {selected_system}\n"
-    elif diagram_type == "Component" and selected_system and selected_container:
-        mermaid_code += f"    title Component Diagram for {selected_container} in {selected_system}\n"
-
-    # Add elements based on diagram type
-    # Persons
-    for person in st.session_state.persons:
-        mermaid_code += f"    Person({person['id']}, \"{person['name']}\", \"{person['description']}\")\n"
-
-    # Systems
-    if diagram_type == "Context":
-        for system in st.session_state.systems:
-            if system["type"] == "Internal":
-                mermaid_code += f"    System({system['id']}, \"{system['name']}\", \"{system['description']}\")\n"
-            else:
-                mermaid_code += f"    System_Ext({system['id']}, \"{system['name']}\", \"{system['description']}\")\n"
-
-    # Containers
-    system_id = None
-    if selected_system:
-        system_id = clean_id(selected_system)
-
-    if diagram_type in ["Container", "Component"] and system_id:
-        # Add the system boundary
-        system_obj = next((s for s in st.session_state.systems if s["id"] == system_id), None)
-        if system_obj:
-            mermaid_code += f"    System_Boundary({system_id}, \"{system_obj['name']}\")"
-
-            # Add containers for the selected system
-            if system_id in st.session_state.containers:
-                for container in st.session_state.containers[system_id]:
-                    if container["technology"]:
-                        mermaid_code += f"    Container({container['id']}, \"{container['name']}\", \"{container['technology']}\", \"{container['description']}\")\n"
-                    else:
-                        mermaid_code += f"    Container({container['id']}, \"{container['name']}\", \"{container['description']}\")\n"
-
-    # Components
-    container_id = None
-    if selected_system and selected_container:
-        container_id = f"{system_id}_{clean_id(selected_container)}"
-
-    if diagram_type == "Component" and container_id:
-        # Add the container boundary
-        container_obj = next((c for c in st.session_state.containers[system_id] if c["id"] == container_id), None)
-        if container_obj:
-            mermaid_code += f"    Container_Boundary({container_id}, \"{container_obj['name']}\")"
-
-            # Add components for the selected container
-            if container_id in st.session_state.components:
-                for component in st.session_state.components[container_id]:
-                    if component["technology"]:
-                        mermaid_code += f"    Component({component['id']}, \"{component['name']}\", \"{component['technology']}\", \"{component['description']}\")\n"
-                    else:
-                        mermaid_code += f"    Component({component['id']}, \"{component['name']}\", \"{component['description']}\")\n"
-
-    # Add relationships based on the diagram type
-    for rel in st.session_state.relationships:
-        # For context diagram, show only relationships involving persons and systems
-        if diagram_type == "Context":
-            source_is_valid = any(p["id"] == rel["source_id"] for p in st.session_state.persons) or any(
-                s["id"] == rel["source_id"] for s in st.session_state.systems)
-            target_is_valid = any(p["id"] == rel["target_id"] for p in st.session_state.persons) or any(
-                s["id"] == rel["target_id"] for s in st.session_state.systems)
-
-            if source_is_valid and target_is_valid:
-                mermaid_code += f"    Rel({rel['source_id']}, {rel['target_id']}, \"{rel['description']}\")\n"
-
-        # For container diagram, include relationships involving the selected system's containers
-        elif diagram_type == "Container" and system_id:
-            # Check if either source or target is in the selected system
-            source_in_system = rel["source_id"] == system_id or rel["source_id"].startswith(f"{system_id}_")
-            target_in_system = rel["target_id"] == system_id or rel["target_id"].startswith(f"{system_id}_")
-
-            if source_in_system or target_in_system:
-                mermaid_code += f"    Rel({rel['source_id']}, {rel['target_id']}, \"{rel['description']}\")\n"
-
-        # For component diagram, include relationships involving the selected container's components
-        elif diagram_type == "Component" and container_id:
-            # Check if either source or target is in the selected container
-            source_in_container = rel["source_id"] == container_id or rel["source_id"].startswith(f"{container_id}_")
-            target_in_container = rel["target_id"] == container_id or rel["target_id"].startswith(f"{container_id}_")
-
-            if source_in_container or target_in_container:
-                mermaid_code += f"    Rel({rel['source_id']}, {rel['target_id']}, \"{rel['description']}\")\n"
-
-    return mermaid_code
-
-
 if __name__ == "__main__":
     main()
@@ -0,0 +1,69 @@
+"""Headless batch renderer for every diagram of a saved C4 model.
+
+Usage::
+
+    python batch.py c4_model.json out/ [--workers N]
+
+Writes ``context.mmd`` plus one ``container_<system>.mmd`` per internal
+system and one ``component_<container>.mmd`` per container, spreading the
+work over a process pool. Does not need Streamlit.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from c4model import load_model
+from diagrams import diagram_file_name, iter_diagram_specs, write_mermaid
+
+# Model loaded once per worker process by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_path):
+    global _worker_model
+    _worker_model = load_model(model_path)
+
+
+def _render_one(spec, output_dir):
+    diagram_type, system_id, container_id = spec
+    path = os.path.join(output_dir, diagram_file_name(diagram_type, system_id, container_id))
+    start = time.perf_counter()
+    with open(path, "w", encoding="utf-8") as f:
+        write_mermaid(f, _worker_model, diagram_type, system_id, container_id)
+    return path, time.perf_counter() - start
+
+
+def render_all(model_path, output_dir, workers=None, report=print):
+    """Render every diagram of the model at ``model_path`` into ``output_dir``
+
+    Returns a list of ``(path, seconds)`` tuples in diagram order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    specs = list(iter_diagram_specs(load_model(model_path)))
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        futures = [pool.submit(_render_one, spec, output_dir) for spec in specs]
+        for future in futures:
+            path, seconds = future.result()
+            results.append((path, seconds))
+            report(f"{seconds * 1000:9.2f} ms  {path}")
+    report(f"Rendered {len(results)} diagrams in {time.perf_counter() - start:.2f} s")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every C4 diagram of a saved model to Mermaid files.")
+    parser.add_argument("model", help="path to a model JSON file saved from the app")
+    parser.add_argument("output_dir", help="directory to write the .mmd files to")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    render_all(args.model, args.output_dir, workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
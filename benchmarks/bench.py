@@ -0,0 +1,185 @@
+"""Benchmarks for model operations, diagram generation and page reruns.
+
+Run from the repository root::
+
+    python -m benchmarks.bench --sizes 10 100 1000 10000 --output bench_results.json
+    python -m benchmarks.bench --compare bench_results.json --output new.json
+
+Models come from a seeded synthetic generator, so runs with the same
+arguments time the same model. Results are written as JSON; ``--compare``
+prints the change against an earlier results file.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+from c4model import ModelStore, clean_id
+from diagrams import generate_mermaid_code
+from sessions import SessionSlot
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# Preset shapes per approximate element count: (systems, containers per system, components per container)
+SIZES = {
+    10: (2, 2, 1),
+    100: (5, 4, 5),
+    1000: (10, 10, 11),
+    10000: (25, 20, 24),
+    100000: (50, 50, 49),
+}
+
+
+def synthetic_model(systems, containers_per_system, components_per_container,
+                    relationship_density=1.0, seed=0):
+    """Build a reproducible model of the given shape
+
+    One person per two systems, every fifth system external (external
+    systems get no containers), and ``relationship_density`` relationships
+    per element between random pairs of elements.
+    """
+    rng = random.Random(seed)
+    model = ModelStore()
+    for p in range(max(1, systems // 2)):
+        model.add_person(f"User {p}", f"Synthetic person {p}")
+    for s in range(systems):
+        external = s % 5 == 4
+        system = model.add_system(f"System {s}", f"Synthetic system {s}", "External" if external else "Internal")
+        if external:
+            continue
+        for c in range(containers_per_system):
+            container = model.add_container(system.id, f"Container {c}", f"Container {c} of system {s}",
+                                            rng.choice(["Python", "Java", "PostgreSQL", "React", ""]))
+            for k in range(components_per_container):
+                model.add_component(container.id, f"Component {k}", f"Component {k} of container {c}",
+                                    rng.choice(["Django", "Spring", ""]))
+    element_ids = list(model.elements)
+    for _ in range(int(len(element_ids) * relationship_density)):
+        source_id, target_id = rng.sample(element_ids, 2)
+        model.add_relationship(source_id, target_id, "uses")
+    return model
+
+
+def _time_ms(fn, repeat):
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _result(benchmark, case, model, samples):
+    return {
+        "benchmark": benchmark,
+        "case": case,
+        "elements": len(model.elements),
+        "relationships": len(model.relationships),
+        "runs": len(samples),
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "max_ms": max(samples),
+    }
+
+
+def bench_clean_id(model, repeat):
+    names = [element.name for element in model.elements.values()]
+    samples = _time_ms(lambda: [clean_id(name) for name in names], repeat)
+    return [_result("clean_id", "all element names", model, samples)]
+
+
+def bench_generate(model, repeat):
+    system = next(s for s in model.systems() if s.type == "Internal")
+    container_id = next(iter(model.children.get(system.id, {})), None)
+    cases = [("Context", None, None), ("Container", system.id, None)]
+    if container_id:
+        cases.append(("Component", system.id, container_id))
+    return [
+        _result("generate_mermaid_code", diagram_type, model,
+                _time_ms(lambda: generate_mermaid_code(model, diagram_type, system_id, cid), repeat))
+        for diagram_type, system_id, cid in cases
+    ]
+
+
+def bench_app_reruns(model, repeat):
+    """Full-page reruns of each wizard step through Streamlit's AppTest harness"""
+    from streamlit.testing.v1 import AppTest
+
+    results = []
+    listeners = list(model.listeners)
+    for step, name in enumerate(["context_diagram", "container_diagram", "component_diagram",
+                                 "relationships", "generate_diagram"], start=1):
+        at = AppTest.from_file(APP_PATH, default_timeout=600)
+        at.session_state["model_slot"] = SessionSlot(model)
+        at.session_state["step"] = step
+        try:
+            samples = _time_ms(at.run, repeat)
+        finally:
+            # Each session attaches its own history and integrity monitor; the next step starts without them
+            model.listeners[:] = listeners
+        if at.exception:
+            raise RuntimeError(f"Step {step} failed: {at.exception[0].message}")
+        results.append(_result("app_rerun", name, model, samples))
+    return results
+
+
+def run(sizes, repeat, density, seed, app_max_elements):
+    results = []
+    for size in sizes:
+        model = synthetic_model(*SIZES[size], relationship_density=density, seed=seed)
+        print(f"size {size}: {len(model.elements)} elements, {len(model.relationships)} relationships",
+              file=sys.stderr)
+        results.extend(bench_clean_id(model, repeat))
+        results.extend(bench_generate(model, repeat))
+        if len(model.elements) <= app_max_elements:
+            results.extend(bench_app_reruns(model, repeat))
+    return results
+
+
+def compare(results, baseline):
+    """Print the median change of every benchmark also present in ``baseline``"""
+    previous = {(r["benchmark"], r["case"], r["elements"]): r for r in baseline["results"]}
+    for r in results:
+        old = previous.get((r["benchmark"], r["case"], r["elements"]))
+        if old:
+            change = (r["median_ms"] / old["median_ms"] - 1) * 100 if old["median_ms"] else 0.0
+            print(f"{r['benchmark']:<22} {r['case']:<20} {r['elements']:>7}  "
+                  f"{old['median_ms']:10.3f} -> {r['median_ms']:10.3f} ms  {change:+6.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the C4 model diagram generator.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000],
+                        choices=sorted(SIZES), help="approximate model sizes in elements")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--density", type=float, default=1.0, help="relationships per element")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--app-max-elements", type=int, default=10000,
+                        help="skip AppTest reruns for models larger than this")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.density, args.seed, args.app_max_elements)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "arguments": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,687 @@
+import itertools
+import json
+import re
+import sys
+from contextlib import contextmanager
+
+
+KINDS = ("person", "system", "container", "component")
+
+SYSTEM_TYPES = ("Internal", "External")
+
+# Versions are drawn from one process-wide counter so a version number
+# identifies a single state of a single model.
+_versions = itertools.count(1)
+
+KIND_LABELS = {
+    "person": "Person",
+    "system": "System",
+    "container": "Container",
+    "component": "Component",
+}
+
+# Kind a parent must have, per child kind
+PARENT_KINDS = {"container": "system", "component": "container"}
+
+
+class IntegrityError(ValueError):
+    """A change that would break the model's ids or references"""
+
+
+def clean_id(text):
+    """Clean text to create valid Mermaid IDs"""
+    return re.sub(r'[^a-zA-Z0-9]', '', text)
+
+
+class Element:
+    """A person, system, container or component.
+
+    ``type`` is only used by systems and ``technology`` only by containers
+    and components. Ids are interned, and ``parent`` is the parent's own id
+    string, so ids are shared rather than copied across records and indexes.
+    """
+
+    __slots__ = ("id", "kind", "name", "description", "parent", "type", "technology")
+
+    def __init__(self, element_id, kind, name, description, parent=None, type=None, technology=None):
+        self.id = sys.intern(element_id)
+        self.kind = kind
+        self.name = name
+        self.description = description
+        self.parent = parent
+        self.type = type
+        self.technology = technology
+
+    def __repr__(self):
+        return f"Element({self.id!r}, {self.kind!r}, {self.name!r})"
+
+
+class Relationship:
+    """A described dependency between two elements, referenced by id"""
+
+    __slots__ = ("id", "source_id", "target_id", "description")
+
+    def __init__(self, rel_id, source_id, target_id, description):
+        self.id = rel_id
+        self.source_id = source_id
+        self.target_id = target_id
+        self.description = description
+
+    def __repr__(self):
+        return f"Relationship({self.id!r}, {self.source_id!r}, {self.target_id!r}, {self.description!r})"
+
+
+class ModelStore:
+    """Indexed store for the elements and relationships of a C4 model.
+
+    Elements are ``Element`` records keyed by id. Alongside the id index the
+    store keeps a per-kind index, a parent -> children index, an element -> relationships
+    index and a roll-up index per diagram (see ``rolled_up_relationships``).
+    All indexes are updated on add and remove so lookups never scan the
+    model.
+    Ordered dicts with ``None`` values are used as insertion-ordered sets.
+
+    ``version`` changes on every mutation and can be used as a cache key for
+    anything derived from the model. ``listeners`` are told about every
+    mutation, and an optional ``loader`` fills the store lazily from storage
+    (see ``persistence``).
+    """
+
+    def __init__(self):
+        self.elements = {}
+        self.relationships = {}
+        self.by_kind = {kind: {} for kind in KINDS}
+        self.children = {}
+        self.element_rels = {}
+        # Diagram scope (None for the context view) -> (source, target) -> relationship
+        # id, or an ordered set of ids once the pair has more than one
+        self.rollups = {}
+        self._rel_rollups = {}
+        self._next_rel_id = 1
+        self.version = next(_versions)
+        self.listeners = []
+        self.loader = None
+        # (event, record, old) of every mutation in the open batch, to roll it back on failure
+        self._batch_depth = 0
+        self._batch_ops = []
+        # Ids of the elements (strings) and relationships (ints) the open batch removed;
+        # storage still has them until it commits, so the loader must not bring them back
+        self._batch_removed = set()
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __contains__(self, element_id):
+        return element_id in self.elements
+
+    # Lookups
+
+    def get(self, element_id):
+        return self.elements.get(element_id)
+
+    def label(self, element_id):
+        """Display label for an element, e.g. 'System: Payments'; the bare id once removed"""
+        element = self.elements.get(element_id)
+        if element is None:
+            return element_id
+        return f"{KIND_LABELS[element.kind]}: {element.name}"
+
+    def of_kind(self, kind):
+        return [self.elements[element_id] for element_id in self.by_kind[kind]]
+
+    def count(self, kind):
+        return len(self.by_kind[kind])
+
+    def persons(self):
+        return self.of_kind("person")
+
+    def systems(self, internal_only=False):
+        systems = self.of_kind("system")
+        if internal_only:
+            return [system for system in systems if system.type == "Internal"]
+        return systems
+
+    def children_of(self, parent_id):
+        return [self.elements[child_id] for child_id in self.children.get(parent_id, ())]
+
+    def containers(self, system_id):
+        return self.children_of(system_id)
+
+    def components(self, container_id):
+        return self.children_of(container_id)
+
+    def all_relationships(self):
+        return list(self.relationships.values())
+
+    def relationships_of(self, element_id):
+        return [self.relationships[rel_id] for rel_id in self.element_rels.get(element_id, ())]
+
+    def rolled_up_relationships(self, scope_id=None):
+        """Relationships lifted to the elements a diagram draws, grouped per direction
+
+        ``scope_id`` is the system of a Container view or the container of a
+        Component view, None for the Context view. Each endpoint is replaced
+        by its highest ancestor that the view does not open up, so a call
+        between two components shows up as a call between their containers
+        or systems. Returns ``(source_id, target_id, relationships)`` tuples;
+        relationships that end up inside a single drawn element are left out.
+        """
+        return [(source_id, target_id, [self.relationships[rel_id] for rel_id in rel_ids]
+                 if isinstance(rel_ids, dict) else [self.relationships[rel_ids]])
+                for (source_id, target_id), rel_ids in self.rollups.get(scope_id, {}).items()]
+
+    def neighborhood(self, element_id, hops):
+        """Elements within ``hops`` relationships of an element, found breadth-first
+
+        Walks the element -> relationships index outwards one hop at a time,
+        so the cost follows the size of the neighborhood, not of the model.
+        Returns ``(distances, rel_ids)``: element id -> hop count in visiting
+        order, and the ids of the relationships between the elements found,
+        in creation order.
+        """
+        distances = {element_id: 0}
+        rel_ids = set()
+        frontier = [element_id]
+        for hop in range(1, hops + 2):
+            if not frontier:
+                break
+            self.ensure_relationships_loaded(frontier)
+            next_frontier = []
+            for eid in frontier:
+                for rel_id in self.element_rels.get(eid, ()):
+                    rel = self.relationships[rel_id]
+                    other = rel.target_id if rel.source_id == eid else rel.source_id
+                    if other not in self.elements:
+                        continue
+                    if other not in distances:
+                        # The extra last round only collects edges within the outermost ring
+                        if hop > hops:
+                            continue
+                        distances[other] = hop
+                        next_frontier.append(other)
+                    rel_ids.add(rel_id)
+            frontier = next_frontier
+        return distances, sorted(rel_ids)
+
+    def dependents(self, element_id):
+        """Everything removing an element takes with it
+
+        Returns ``(element_ids, rel_ids)``: the element and its descendants,
+        parents before children, and the ids of the relationships touching
+        any of them. The cost follows the size of the subtree.
+        """
+        self.ensure_loaded(element_id, deep=True)
+        element_ids = [element_id]
+        for eid in element_ids:
+            element_ids.extend(self.children.get(eid, ()))
+        rel_ids = {rel_id for eid in element_ids for rel_id in self.element_rels.get(eid, ())}
+        return element_ids, sorted(rel_ids)
+
+    def ancestors(self, element_id):
+        """Yield the element id followed by the ids of its parents"""
+        while element_id is not None:
+            yield element_id
+            element = self.elements.get(element_id)
+            element_id = element.parent if element else None
+
+    # Mutations
+    #
+    # Every public mutation updates the indexes, bumps ``version`` and then
+    # tells the listeners. A listener is called as ``listener(event, obj, old)``
+    # where ``event`` is one of add_element, update_element, remove_element,
+    # add_relationship, update_relationship or remove_relationship, with
+    # ``old`` holding the previous field values for updates.
+    #
+    # Mutations always happen inside a batch; one made outside ``batch()``
+    # gets a batch of its own. A batch is announced with begin_batch and
+    # closed with end_batch. Just before the outermost end_batch, listeners
+    # get commit_batch, where one that persists the changes may refuse them
+    # by raising. If anything raises inside a batch, its mutations are
+    # reverted, each with its own event, and the listeners get abort_batch
+    # instead of end_batch.
+    #
+    # Records read from storage by ``insert_loaded`` are not mutations and
+    # are not batched; listeners get a single load event with ``obj`` being
+    # ``(elements, relationships)``, the records that were actually added.
+
+    def add_person(self, name, description):
+        return self._add(Element(clean_id(name), "person", name, description))
+
+    def add_system(self, name, description, system_type):
+        return self._add(Element(clean_id(name), "system", name, description, type=system_type))
+
+    def add_container(self, system_id, name, description, technology):
+        parent = self._parent_id(system_id, PARENT_KINDS["container"])
+        return self._add(Element(f"{parent}_{clean_id(name)}", "container", name, description,
+                                 parent=parent, technology=technology))
+
+    def add_component(self, container_id, name, description, technology):
+        parent = self._parent_id(container_id, PARENT_KINDS["component"])
+        return self._add(Element(f"{parent}_{clean_id(name)}", "component", name, description,
+                                 parent=parent, technology=technology))
+
+    def add_relationship(self, source_id, target_id, description):
+        if source_id == target_id:
+            raise ValueError("Source and target cannot be the same!")
+        for element_id in (source_id, target_id):
+            if element_id not in self.elements:
+                raise ValueError(f"Unknown element '{element_id}'.")
+        # Reference the elements' own id strings instead of keeping copies
+        source_id = self.elements[source_id].id
+        target_id = self.elements[target_id].id
+        if self.loader is not None:
+            rel_id = self.loader.next_relationship_id()
+        else:
+            rel_id = self._next_rel_id
+        self._next_rel_id = max(self._next_rel_id, rel_id + 1)
+        rel = Relationship(rel_id, source_id, target_id, description)
+        self._index_relationship(rel)
+        self._touch()
+        self._notify("add_relationship", rel)
+        return rel
+
+    def insert_element(self, element):
+        """Add an existing ``Element`` record as is, e.g. one removed earlier"""
+        return self._add(element)
+
+    def insert_relationship(self, rel):
+        """Add an existing ``Relationship`` record with its id, e.g. one removed earlier
+
+        The endpoints are not checked, so the relationships of removed
+        elements can be put back as they were.
+        """
+        if rel.id in self.relationships:
+            raise ValueError(f"A relationship with id {rel.id} already exists.")
+        return self._insert_relationship(rel)
+
+    def update_element(self, element_id, **fields):
+        """Change descriptive fields of an element; ids, kinds and parents are fixed"""
+        element = self.elements[element_id]
+        for field in fields:
+            if field not in _EDITABLE_FIELDS[element.kind]:
+                raise ValueError(f"Field '{field}' of {element.kind} '{element_id}' cannot be edited.")
+        return self._set_fields("update_element", element, fields)
+
+    def update_relationship(self, rel_id, description):
+        return self._set_fields("update_relationship", self.relationships[rel_id], {"description": description})
+
+    def remove(self, element_id, cascade=False):
+        """Remove an element
+
+        An element with children or relationships is refused with an
+        ``IntegrityError``, unless ``cascade`` is set: then its descendants
+        and every relationship touching them go too, in one batch.
+        """
+        element_ids, rel_ids = self.dependents(element_id)
+        if len(element_ids) == 1 and not rel_ids:
+            return self._remove_element(element_id)
+        if not cascade:
+            raise IntegrityError(f"{self.label(element_id)} still has {len(element_ids) - 1} nested elements "
+                                 f"and {len(rel_ids)} relationships.")
+        # Newest relationships and deepest elements first: no step leaves anything dangling,
+        # and undo puts everything back in its original order
+        with self.batch():
+            for rel_id in reversed(rel_ids):
+                self.remove_relationship(rel_id)
+            for eid in reversed(element_ids[1:]):
+                self._remove_element(eid)
+            return self._remove_element(element_id)
+
+    def _remove_element(self, element_id):
+        element = self.elements.pop(element_id)
+        del self.by_kind[element.kind][element_id]
+        if element.parent is not None:
+            siblings = self.children.get(element.parent)
+            if siblings is not None:
+                siblings.pop(element_id, None)
+                if not siblings:
+                    del self.children[element.parent]
+        # Its own entries are kept while records still point at it, so those can be found
+        for index in (self.children, self.element_rels):
+            if element_id in index and not index[element_id]:
+                del index[element_id]
+        self._touch()
+        self._notify("remove_element", element)
+        return element
+
+    def remove_relationship(self, rel_id):
+        rel = self.relationships.pop(rel_id)
+        for element_id in (rel.source_id, rel.target_id):
+            rel_ids = self.element_rels.get(element_id)
+            if rel_ids is not None:
+                rel_ids.pop(rel_id, None)
+                if not rel_ids:
+                    del self.element_rels[element_id]
+        self._unindex_rollups(rel_id)
+        self._touch()
+        self._notify("remove_relationship", rel)
+        return rel
+
+    @contextmanager
+    def batch(self):
+        """Group the mutations made inside the block; all of them are reverted if the block raises"""
+        start = len(self._batch_ops)
+        self._batch_depth += 1
+        self._notify_listeners("begin_batch", None)
+        end_event = "abort_batch"
+        try:
+            yield self
+            if self._batch_depth == 1:
+                self._notify_listeners("commit_batch", None)
+            end_event = "end_batch"
+        except BaseException:
+            self._rollback(start)
+            raise
+        finally:
+            # Closed even if the rollback fails, so later mutations still get their commit
+            self._close_batch(start)
+            self._notify_listeners(end_event, None)
+
+    def _close_batch(self, start):
+        self._batch_depth -= 1
+        # An inner batch's operations stay logged until the outermost one ends
+        if not self._batch_depth:
+            del self._batch_ops[start:]
+            self._batch_removed.clear()
+
+    def _rollback(self, start):
+        """Revert the mutations logged since ``start``, newest first, with the raw index operations"""
+        ops = self._batch_ops[start:]
+        for event, obj, old in reversed(ops):
+            if event == "add_element":
+                self._remove_element(obj.id)
+            elif event == "remove_element":
+                self._insert(obj)
+            elif event == "add_relationship":
+                self.remove_relationship(obj.id)
+            elif event == "remove_relationship":
+                self._insert_relationship(obj)
+            else:
+                self._set_fields(event, obj, old)
+        del self._batch_ops[start:]
+
+    # Lazy loading
+
+    def ensure_loaded(self, element_id, deep=False):
+        """Make sure the children of an element (its whole subtree if ``deep``) are in memory"""
+        if self.loader is not None:
+            self.loader.load(self, element_id, deep)
+
+    def ensure_relationships_loaded(self, element_ids):
+        """Make sure every relationship touching the given elements is in memory"""
+        if self.loader is not None:
+            self.loader.load_relationships(self, element_ids)
+
+    def ensure_all_loaded(self):
+        if self.loader is not None:
+            self.loader.load_all(self)
+
+    def insert_loaded(self, elements=(), relationships=()):
+        """Add records read from storage, announced to the listeners as one load event
+
+        Elements and relationships already in memory or removed by the open
+        batch are skipped, as are relationships whose endpoints are not
+        loaded.
+        """
+        removed = self._batch_removed
+        loaded_elements = []
+        loaded_rels = []
+        for element in elements:
+            if element.id not in self.elements and element.id not in removed:
+                self._index_element(element)
+                loaded_elements.append(element)
+        for rel in relationships:
+            if rel.id not in self.relationships and rel.id not in removed \
+                    and rel.source_id in self.elements and rel.target_id in self.elements:
+                rel.source_id = self.elements[rel.source_id].id
+                rel.target_id = self.elements[rel.target_id].id
+                self._index_relationship(rel)
+                self._next_rel_id = max(self._next_rel_id, rel.id + 1)
+                loaded_rels.append(rel)
+        if loaded_elements or loaded_rels:
+            self._touch()
+            self._notify_listeners("load", (loaded_elements, loaded_rels))
+
+    def _parent_id(self, parent_id, kind):
+        """The interned id of an existing parent of the given kind"""
+        parent = self.elements.get(parent_id)
+        if parent is None or parent.kind != kind:
+            raise IntegrityError(f"'{parent_id}' is not an existing {KIND_LABELS[kind].lower()}.")
+        return parent.id
+
+    def _touch(self):
+        self.version = next(_versions)
+
+    def _notify(self, event, obj, old=None):
+        """Tell the listeners about a mutation already applied to the indexes"""
+        if not self._batch_depth:
+            if not self.listeners:
+                # Nothing can refuse the change, so there is nothing to roll back
+                return
+            with self.batch():
+                self._notify(event, obj, old)
+            return
+        self._batch_ops.append((event, obj, old))
+        if event in ("remove_element", "remove_relationship") and self.loader is not None:
+            self._batch_removed.add(obj.id)
+        self._notify_listeners(event, obj, old)
+
+    def _notify_listeners(self, event, obj, old=None):
+        for listener in self.listeners:
+            listener(event, obj, old)
+
+    def _add(self, element):
+        element_id = element.id
+        if not element_id:
+            raise ValueError(f"'{element.name}' does not contain any letters or digits to build an id from.")
+        if element.parent is not None:
+            # Sibling ids are only guaranteed to be in memory once the parent is loaded
+            self.ensure_loaded(element.parent)
+        existing = self.elements.get(element_id)
+        if existing is not None:
+            # Names that differ only in punctuation or spaces clean to the same id
+            raise IntegrityError(f"'{element.name}' gets the id '{element_id}', which {self.label(element_id)} "
+                                 f"already has.")
+        return self._insert(element)
+
+    def _insert(self, element):
+        self._index_element(element)
+        if self.loader is not None:
+            self.loader.mark_new(element.id)
+        self._touch()
+        self._notify("add_element", element)
+        return element
+
+    def _insert_relationship(self, rel):
+        self._index_relationship(rel)
+        self._next_rel_id = max(self._next_rel_id, rel.id + 1)
+        self._touch()
+        self._notify("add_relationship", rel)
+        return rel
+
+    def _set_fields(self, event, record, fields):
+        old = {field: getattr(record, field) for field in fields}
+        for field, value in fields.items():
+            setattr(record, field, value)
+        self._touch()
+        self._notify(event, record, old)
+        return record
+
+    def _index_element(self, element):
+        self.elements[element.id] = element
+        self.by_kind[element.kind][element.id] = None
+        if element.parent is not None:
+            self.children.setdefault(element.parent, {})[element.id] = None
+        if element.id in self.element_rels or element.id in self.children:
+            # Relationships kept while the element was missing lift to other elements now
+            self._reindex_rollups(element.id)
+
+    def _index_relationship(self, rel):
+        self.relationships[rel.id] = rel
+        self.element_rels.setdefault(rel.source_id, {})[rel.id] = None
+        self.element_rels.setdefault(rel.target_id, {})[rel.id] = None
+        self._index_rollups(rel)
+
+    def _index_rollups(self, rel):
+        # Root-first ancestor paths; the diagrams that show the relationship are
+        # the context view and the views of each system or container on them
+        source_path = tuple(self.ancestors(rel.source_id))[::-1]
+        target_path = tuple(self.ancestors(rel.target_id))[::-1]
+        scopes = {None: ()}
+        for path in (source_path, target_path):
+            for depth, element_id in enumerate(path):
+                element = self.elements.get(element_id)
+                if element is not None and element.kind in ("system", "container"):
+                    scopes[element_id] = path[:depth + 1]
+        # Remember the entries, flattened, so removal does not depend on parents still existing
+        entries = []
+        for scope_id, scope_path in scopes.items():
+            pair = (_lift(source_path, scope_path), _lift(target_path, scope_path))
+            if pair[0] != pair[1]:
+                rollup = self.rollups.setdefault(scope_id, {})
+                rel_ids = rollup.get(pair)
+                if rel_ids is None:
+                    rollup[pair] = rel.id
+                elif isinstance(rel_ids, dict):
+                    rel_ids[rel.id] = None
+                else:
+                    rollup[pair] = {rel_ids: None, rel.id: None}
+                entries += (scope_id, pair)
+        self._rel_rollups[rel.id] = tuple(entries)
+
+    def _unindex_rollups(self, rel_id):
+        entries = self._rel_rollups.pop(rel_id)
+        for scope_id, pair in zip(entries[::2], entries[1::2]):
+            rollup = self.rollups[scope_id]
+            rel_ids = rollup[pair]
+            if not isinstance(rel_ids, dict):
+                del rollup[pair]
+                if not rollup:
+                    del self.rollups[scope_id]
+                continue
+            del rel_ids[rel_id]
+            if len(rel_ids) == 1:
+                rollup[pair] = next(iter(rel_ids))
+
+    def _reindex_rollups(self, element_id):
+        """Recompute the roll-ups of every relationship touching an element's subtree"""
+        rel_ids = {}
+        pending = [element_id]
+        while pending:
+            eid = pending.pop()
+            rel_ids.update(dict.fromkeys(self.element_rels.get(eid, ())))
+            pending.extend(self.children.get(eid, ()))
+        for rel_id in sorted(rel_ids):
+            self._unindex_rollups(rel_id)
+            self._index_rollups(self.relationships[rel_id])
+
+
+def _lift(path, scope_path):
+    """The element of a root-first ancestor path drawn in a view opening up ``scope_path``"""
+    for depth, element_id in enumerate(path):
+        if depth >= len(scope_path) or scope_path[depth] != element_id:
+            return element_id
+    return path[-1]
+
+
+# Element fields written to a saved model besides id, kind and parent
+_ELEMENT_FIELDS = {
+    "person": ("name", "description"),
+    "system": ("name", "description", "type"),
+    "container": ("name", "description", "technology"),
+    "component": ("name", "description", "technology"),
+}
+
+# Fields that can be changed after an element is created
+_EDITABLE_FIELDS = {kind: tuple(field for field in fields if field != "name")
+                    for kind, fields in _ELEMENT_FIELDS.items()}
+
+MODEL_FORMAT_VERSION = 1
+
+
+def element_to_record(element):
+    record = {"kind": element.kind, "id": element.id, "parent": element.parent}
+    for field in _ELEMENT_FIELDS[element.kind]:
+        record[field] = getattr(element, field)
+    return record
+
+
+def relationship_to_record(rel):
+    return {"source_id": rel.source_id, "target_id": rel.target_id, "description": rel.description}
+
+
+def model_to_dict(model):
+    """Plain JSON-compatible representation of a model, parents before children"""
+    elements = [element_to_record(element) for kind in KINDS for element in model.of_kind(kind)]
+    relationships = [relationship_to_record(rel) for rel in model.all_relationships()]
+    return {"format": MODEL_FORMAT_VERSION, "elements": elements, "relationships": relationships}
+
+
+def model_from_dict(data):
+    """Rebuild a ModelStore from ``model_to_dict`` output"""
+    model = ModelStore()
+    for record in data.get("elements", ()):
+        kind = record["kind"]
+        if kind in ("container", "component") and record["parent"] not in model:
+            # Files saved before removal cascaded can hold orphans; keep them as they were
+            model.insert_element(Element(f"{record['parent']}_{clean_id(record['name'])}", kind, record["name"],
+                                         record["description"], parent=sys.intern(record["parent"]),
+                                         technology=record.get("technology", "")))
+        elif kind == "person":
+            model.add_person(record["name"], record["description"])
+        elif kind == "system":
+            model.add_system(record["name"], record["description"], record.get("type", "Internal"))
+        elif kind == "container":
+            model.add_container(record["parent"], record["name"], record["description"], record.get("technology", ""))
+        elif kind == "component":
+            model.add_component(record["parent"], record["name"], record["description"], record.get("technology", ""))
+        else:
+            raise ValueError(f"Unknown element kind '{kind}'.")
+    for record in data.get("relationships", ()):
+        if record["source_id"] in model and record["target_id"] in model:
+            model.add_relationship(record["source_id"], record["target_id"], record["description"])
+        else:
+            # Likewise the relationships of elements removed by then
+            model.insert_relationship(Relationship(model._next_rel_id, sys.intern(record["source_id"]),
+                                                   sys.intern(record["target_id"]), record["description"]))
+    return model
+
+
+def model_to_rows(model):
+    """Compact snapshot of a model as plain lists, keeping relationship ids"""
+    return {
+        "next_rel_id": model._next_rel_id,
+        "elements": [[e.id, e.kind, e.parent, e.name, e.description, e.type, e.technology]
+                     for kind in KINDS for e in model.of_kind(kind)],
+        "relationships": [[r.id, r.source_id, r.target_id, r.description] for r in model.all_relationships()],
+    }
+
+
+def model_from_rows(rows):
+    """Rebuild a ModelStore from ``model_to_rows`` output
+
+    Relationships whose endpoints had been removed are restored as they
+    were, so the integrity report sees them too.
+    """
+    model = ModelStore()
+    model.insert_loaded(
+        Element(element_id, kind, name, description, parent=parent, type=element_type, technology=technology)
+        for element_id, kind, parent, name, description, element_type, technology in rows["elements"])
+    elements = model.elements
+    for rel_id, source_id, target_id, description in rows["relationships"]:
+        # Share the elements' own id strings, as insert_loaded does
+        source_id = elements[source_id].id if source_id in elements else sys.intern(source_id)
+        target_id = elements[target_id].id if target_id in elements else sys.intern(target_id)
+        model.insert_relationship(Relationship(rel_id, source_id, target_id, description))
+    model._next_rel_id = max(model._next_rel_id, rows["next_rel_id"])
+    return model
+
+
+def dump_model(model):
+    """Serialize a model to a JSON string"""
+    return json.dumps(model_to_dict(model), indent=2)
+
+
+def load_model(path):
+    with open(path, encoding="utf-8") as f:
+        return model_from_dict(json.load(f))
@@ -0,0 +1,241 @@
+"""Mermaid C4 code generation, independent of the Streamlit UI"""
+from collections import OrderedDict
+
+
+class DiagramCache:
+    """Bounded LRU cache of generated diagrams with hit/miss counters.
+
+    Keys are ``(model.version, diagram_type, system_id, container_id)``, so
+    any mutation of the model makes earlier entries unreachable; they simply
+    age out of the LRU.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+def iter_diagram_specs(model):
+    """Yield ``(diagram_type, system_id, container_id)`` for every diagram of the model"""
+    yield "Context", None, None
+    for system in model.systems(internal_only=True):
+        yield "Container", system.id, None
+        for container in model.containers(system.id):
+            yield "Component", system.id, container.id
+
+
+def diagram_file_name(diagram_type, system_id=None, container_id=None):
+    if diagram_type == "Component":
+        return f"component_{container_id}.mmd"
+    if diagram_type == "Container":
+        return f"container_{system_id}.mmd"
+    return "context.mmd"
+
+
+def generate_mermaid_code(model, diagram_type, system_id=None, container_id=None):
+    """Generate Mermaid code based on the data and selected diagram type
+
+    ``system_id`` and ``container_id`` are the ids of the selected system and
+    container; they are resolved through the model store's id index.
+    """
+    return "".join(iter_mermaid_lines(model, diagram_type, system_id, container_id))
+
+
+def generate_focus_code(model, element_id, hops):
+    """Generate Mermaid code for the neighborhood of one element, ``hops`` relationships deep"""
+    return "".join(iter_focus_lines(model, element_id, hops))
+
+
+def write_mermaid(sink, model, diagram_type, system_id=None, container_id=None):
+    """Stream Mermaid code line by line into a writable file-like object"""
+    sink.writelines(iter_mermaid_lines(model, diagram_type, system_id, container_id))
+
+
+# A diagram is produced as a stream of items that the Mermaid and SVG
+# writers both consume:
+#   ("title", text)
+#   ("node", depth, macro, element, technology)
+#   ("begin", depth, macro, element)      opens a boundary
+#   ("end", depth)                        closes it
+#   ("rel", source_id, target_id, label, technology)
+# ``technology`` is None where the macro takes none.
+
+_BOUNDARIES = {"system": "System_Boundary", "container": "Container_Boundary"}
+
+
+def _node_item(depth, element):
+    if element.kind == "person":
+        return "node", depth, "Person", element, None
+    if element.kind == "system":
+        return "node", depth, "System" if element.type == "Internal" else "System_Ext", element, None
+    return "node", depth, element.kind.capitalize(), element, element.technology
+
+
+def _rel_item(rel):
+    return "rel", rel.source_id, rel.target_id, rel.description, None
+
+
+def _rollup_item(source_id, target_id, rels):
+    """One item for all relationships between two drawn elements, with their count"""
+    if len(rels) == 1 and (rels[0].source_id, rels[0].target_id) == (source_id, target_id):
+        return _rel_item(rels[0])
+    labels = list(dict.fromkeys(rel.description for rel in rels))
+    label = ", ".join(labels[:3])
+    if len(labels) > 3:
+        label += f" and {len(labels) - 3} more"
+    return "rel", source_id, target_id, label, f"{len(rels)} relationship{'s' if len(rels) != 1 else ''}"
+
+
+def mermaid_line(item):
+    """The Mermaid code line for one diagram item"""
+    kind = item[0]
+    if kind == "rel":
+        _, source_id, target_id, label, technology = item
+        if technology:
+            return f"    Rel({source_id}, {target_id}, \"{label}\", \"{technology}\")\n"
+        return f"    Rel({source_id}, {target_id}, \"{label}\")\n"
+    if kind == "title":
+        return f"    title {item[1]}\n"
+    indent = "    " * (item[1] + 1)
+    if kind == "end":
+        return f"{indent}}}\n"
+    if kind == "begin":
+        _, _, macro, element = item
+        return f"{indent}{macro}({element.id}, \"{element.name}\") {{\n"
+    _, _, macro, element, technology = item
+    if technology:
+        return f"{indent}{macro}({element.id}, \"{element.name}\", \"{technology}\", \"{element.description}\")\n"
+    return f"{indent}{macro}({element.id}, \"{element.name}\", \"{element.description}\")\n"
+
+
+def iter_mermaid_lines(model, diagram_type, system_id=None, container_id=None):
+    """Yield the Mermaid code for a diagram one newline-terminated line at a time"""
+    yield "C4Context\n"
+    for item in iter_diagram_items(model, diagram_type, system_id, container_id):
+        yield mermaid_line(item)
+
+
+def iter_diagram_items(model, diagram_type, system_id=None, container_id=None):
+    """Yield the items of a Context, Container or Component diagram"""
+    system_obj = model.get(system_id) if system_id else None
+    container_obj = model.get(container_id) if container_id else None
+
+    # Title based on diagram type
+    if diagram_type == "Context":
+        yield "title", "Context Diagram"
+    elif diagram_type == "Container" and system_obj:
+        yield "title", f"Container Diagram for {system_obj.name}"
+    elif diagram_type == "Component" and system_obj and container_obj:
+        yield "title", f"Component Diagram for {container_obj.name} in {system_obj.name}"
+
+    # Relationships lifted to the drawn elements, skipping those of removed elements
+    scope_id = {"Container": system_id, "Component": container_id}.get(diagram_type)
+    rollups = []
+    if diagram_type == "Context" or scope_id:
+        for source_id, target_id, rels in model.rolled_up_relationships(scope_id):
+            rels = [rel for rel in rels if rel.source_id in model and rel.target_id in model]
+            if rels and source_id in model and target_id in model:
+                rollups.append((source_id, target_id, rels))
+
+    # Add elements based on diagram type
+    # Persons
+    for person in model.persons():
+        yield _node_item(0, person)
+
+    # Systems; Container and Component views draw only those the selected system depends on or is used by
+    if diagram_type == "Context":
+        for system in model.systems():
+            yield _node_item(0, system)
+    elif system_obj:
+        others = {element_id: None for pair in rollups for element_id in pair[:2]
+                  if element_id != system_id and model.elements[element_id].kind == "system"}
+        for element_id in others:
+            yield _node_item(0, model.elements[element_id])
+
+    # Containers, with the selected container opened up as a boundary in the Component view
+    if diagram_type in ["Container", "Component"] and system_obj:
+        yield "begin", 0, "System_Boundary", system_obj
+        for container in model.containers(system_id):
+            if diagram_type == "Component" and container.id == container_id:
+                yield "begin", 1, "Container_Boundary", container
+                for component in model.components(container_id):
+                    yield _node_item(2, component)
+                yield "end", 1
+            else:
+                yield _node_item(1, container)
+        yield "end", 0
+
+    # Add relationships, merged per pair of drawn elements
+    for source_id, target_id, rels in rollups:
+        yield _rollup_item(source_id, target_id, rels)
+
+
+def iter_focus_lines(model, element_id, hops):
+    """Yield the Mermaid code for the elements within ``hops`` relationships of an element"""
+    yield "C4Context\n"
+    for item in iter_focus_items(model, element_id, hops):
+        yield mermaid_line(item)
+
+
+def iter_focus_items(model, element_id, hops):
+    """Yield the items of a diagram of the elements within ``hops`` relationships of an element
+
+    The neighborhood comes from ``ModelStore.neighborhood``. Each element is
+    drawn inside boundaries for its system and container, and an element
+    with neighbors inside it becomes a boundary itself.
+    """
+    focus = model.get(element_id)
+    distances, rel_ids = model.neighborhood(element_id, hops)
+    yield "title", f"{focus.name} and its neighbors within {hops} hop{'s' if hops != 1 else ''}"
+
+    # Group the elements under their parents, top level under None
+    members = {}
+    for node in distances:
+        while True:
+            parent = model.elements[node].parent
+            if parent not in model:
+                parent = None
+            siblings = members.setdefault(parent, {})
+            known = node in siblings
+            siblings[node] = None
+            if known or parent is None:
+                break
+            node = parent
+
+    def boundary_items(parent, depth):
+        for node in members.get(parent, ()):
+            element = model.elements[node]
+            if node in members:
+                yield "begin", depth, _BOUNDARIES[element.kind], element
+                yield from boundary_items(node, depth + 1)
+                yield "end", depth
+            else:
+                yield _node_item(depth, element)
+
+    yield from boundary_items(None, 0)
+    for rel_id in rel_ids:
+        yield _rel_item(model.relationships[rel_id])
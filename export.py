@@ -0,0 +1,103 @@
+"""Export every diagram of a model, plus the model file, as one ZIP archive.
+
+``write_archive`` streams the entries into the archive one at a time, so
+only the diagram being written is held in memory. ``ExportJob`` runs it on
+a worker thread over a snapshot of the model, so the session can keep
+editing while the export runs, and reports its progress.
+"""
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+import weakref
+import zipfile
+
+from c4model import model_from_rows, model_to_dict, model_to_rows
+from diagrams import diagram_file_name, generate_mermaid_code, iter_diagram_items, iter_diagram_specs
+from sessions import remove_file
+from svg_renderer import render_svg
+
+
+def write_archive(model, path, progress=None, svg_cache=None):
+    """Write the model file and each diagram as Mermaid and SVG into a ZIP at ``path``
+
+    ``progress(done, total)`` is called after each entry. SVGs come from
+    ``svg_cache`` when given and are added to it. The archive appears at
+    ``path`` only once it is complete.
+    """
+    specs = list(iter_diagram_specs(model))
+    total = len(specs) + 1
+    tmp_path = f"{path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("c4_model.json", "w") as raw, io.TextIOWrapper(raw, encoding="utf-8") as f:
+            json.dump(model_to_dict(model), f, indent=2)
+        if progress:
+            progress(1, total)
+        for done, (diagram_type, system_id, container_id) in enumerate(specs, 2):
+            name = diagram_file_name(diagram_type, system_id, container_id)
+            mermaid_code = generate_mermaid_code(model, diagram_type, system_id, container_id)
+            archive.writestr(f"mermaid/{name}", mermaid_code)
+            svg_path = svg_cache.get(mermaid_code) if svg_cache is not None else None
+            svg = None
+            if svg_path is not None:
+                try:
+                    with open(svg_path, encoding="utf-8") as f:
+                        svg = f.read()
+                except FileNotFoundError:
+                    # Pruned from the cache by another session in the meantime
+                    pass
+            if svg is None:
+                svg = render_svg(iter_diagram_items(model, diagram_type, system_id, container_id))
+                if svg_cache is not None:
+                    svg_cache.put(mermaid_code, svg)
+            archive.writestr(f"svg/{os.path.splitext(name)[0]}.svg", svg)
+            if progress:
+                progress(done, total)
+    os.replace(tmp_path, path)
+
+
+class ExportJob:
+    """One background export of a model into a ZIP file.
+
+    The model is snapshotted when the job is created; the worker rebuilds
+    it from the snapshot, so later edits do not affect the export. The
+    archive file is deleted when the job is garbage collected.
+    """
+
+    def __init__(self, model, directory=None, svg_cache=None):
+        directory = directory or os.path.join(tempfile.gettempdir(), "c4_exports")
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"c4_export_{uuid.uuid4().hex}.zip")
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self._rows = model_to_rows(model)
+        self._svg_cache = svg_cache
+        self._thread = threading.Thread(target=self._run, name="c4-export", daemon=True)
+        weakref.finalize(self, remove_file, self.path)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 0.0
+
+    def _progress(self, done, total):
+        self.done, self.total = done, total
+
+    def _run(self):
+        try:
+            model = model_from_rows(self._rows)
+            self._rows = None
+            write_archive(model, self.path, self._progress, self._svg_cache)
+        except Exception as e:
+            self.error = e
+            remove_file(f"{self.path}.tmp")
@@ -0,0 +1,148 @@
+"""Undo and redo for a ModelStore, kept as a log of reversible operations.
+
+``History`` listens to the model's mutation events and records each one
+with just the records and field values it touched, so the history grows
+with the size of the edits rather than the size of the model. Mutations
+made inside ``model.batch()`` form a single entry. Undoing or redoing N
+entries applies only those entries' operations, newest first for undo.
+Undoing a removal puts the record back at the end of its lists.
+"""
+from contextlib import contextmanager
+
+from c4model import KIND_LABELS
+
+_VERBS = {
+    "add_element": "Add",
+    "update_element": "Edit",
+    "remove_element": "Remove",
+    "add_relationship": "Add",
+    "update_relationship": "Edit",
+    "remove_relationship": "Remove",
+}
+
+
+class History:
+    """Bounded undo/redo stacks of operation entries for one model"""
+
+    def __init__(self, model, limit=200):
+        self.model = model
+        self.limit = limit
+        self.undo_stack = []
+        self.redo_stack = []
+        # Length of ``_pending`` when each open batch began
+        self._starts = []
+        self._pending = []
+        self._replaying = False
+        model.listeners.append(self)
+
+    def __call__(self, event, obj, old=None):
+        if self._replaying:
+            return
+        if event == "begin_batch":
+            self._starts.append(len(self._pending))
+            return
+        if event == "end_batch":
+            self._starts.pop()
+            if not self._starts and self._pending:
+                entry, self._pending = self._pending, []
+                self._push(entry)
+            return
+        if event == "abort_batch":
+            # The store has reverted the batch, so none of it is history
+            del self._pending[self._starts.pop():]
+            return
+        if event in ("commit_batch", "load"):
+            return
+        # Updates keep both the old and the new values of the changed fields
+        new = {field: getattr(obj, field) for field in old} if old is not None else None
+        self._pending.append((event, obj, old, new))
+
+    def _push(self, entry):
+        self.undo_stack.append(entry)
+        del self.undo_stack[:-self.limit]
+        self.redo_stack.clear()
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def undo(self, steps=1):
+        """Revert the last ``steps`` entries; returns how many were reverted"""
+        steps = min(steps, len(self.undo_stack))
+        entries = self.undo_stack[len(self.undo_stack) - steps:]
+        with self._replay():
+            for entry in reversed(entries):
+                for op in reversed(entry):
+                    self._revert(op)
+        # Moved only once all of them applied; a failed replay is rolled back whole by the batch
+        del self.undo_stack[len(self.undo_stack) - steps:]
+        self.redo_stack.extend(reversed(entries))
+        return steps
+
+    def redo(self, steps=1):
+        """Reapply the last ``steps`` undone entries; returns how many were reapplied"""
+        steps = min(steps, len(self.redo_stack))
+        entries = self.redo_stack[len(self.redo_stack) - steps:]
+        with self._replay():
+            for entry in reversed(entries):
+                for op in entry:
+                    self._apply(op)
+        del self.redo_stack[len(self.redo_stack) - steps:]
+        self.undo_stack.extend(reversed(entries))
+        return steps
+
+    @contextmanager
+    def _replay(self):
+        # One batch so a database-backed model writes the whole jump in one transaction
+        self._replaying = True
+        try:
+            with self.model.batch():
+                yield
+        finally:
+            self._replaying = False
+
+    def _apply(self, op):
+        event, obj, old, new = op
+        model = self.model
+        if event == "add_element":
+            model.insert_element(obj)
+        elif event == "update_element":
+            model.update_element(obj.id, **new)
+        elif event == "remove_element":
+            model.remove(obj.id)
+        elif event == "add_relationship":
+            model.insert_relationship(obj)
+        elif event == "update_relationship":
+            model.update_relationship(obj.id, new["description"])
+        elif event == "remove_relationship":
+            model.remove_relationship(obj.id)
+
+    def _revert(self, op):
+        event, obj, old, new = op
+        model = self.model
+        if event == "add_element":
+            model.remove(obj.id)
+        elif event == "update_element":
+            model.update_element(obj.id, **old)
+        elif event == "remove_element":
+            model.insert_element(obj)
+        elif event == "add_relationship":
+            model.remove_relationship(obj.id)
+        elif event == "update_relationship":
+            model.update_relationship(obj.id, old["description"])
+        elif event == "remove_relationship":
+            model.insert_relationship(obj)
+
+
+def describe(entry):
+    """Short description of a history entry, e.g. 'Add Container: Api'"""
+    if len(entry) > 1:
+        return f"{len(entry)} changes"
+    event, obj, _, _ = entry[0]
+    if event.endswith("_relationship"):
+        return f"{_VERBS[event]} relationship {obj.source_id} -> {obj.target_id}"
+    return f"{_VERBS[event]} {KIND_LABELS[obj.kind]}: {obj.name}"
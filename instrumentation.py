@@ -0,0 +1,94 @@
+"""Opt-in timing and size metrics with Prometheus text export.
+
+Timings are kept in bounded rolling windows per name for the p50/p95 shown
+in the app, plus cumulative sums and counts for the exported summaries.
+Gauges hold the latest value reported. One ``Metrics`` instance is shared
+by all sessions of the server process; it is thread-safe.
+"""
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a non-empty sequence, ``q`` in [0, 1]"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+class Metrics:
+    """Rolling timers and gauges for one process"""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._sums = {}
+        self._counts = {}
+        self._gauges = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self.window)
+                self._sums[name] = 0.0
+                self._counts[name] = 0
+            self._samples[name].append(seconds)
+            self._sums[name] += seconds
+            self._counts[name] += 1
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def summary(self):
+        """``{name: (p50, p95, count)}`` over the rolling windows, in seconds"""
+        with self._lock:
+            windows = {name: list(samples) for name, samples in self._samples.items()}
+            counts = dict(self._counts)
+        return {name: (percentile(samples, 0.5), percentile(samples, 0.95), counts[name])
+                for name, samples in windows.items() if samples}
+
+    def gauges(self):
+        with self._lock:
+            return dict(self._gauges)
+
+    def to_prometheus(self, prefix="c4"):
+        """Render all metrics in the Prometheus text exposition format"""
+        summary = self.summary()
+        with self._lock:
+            sums = dict(self._sums)
+            gauges = dict(self._gauges)
+        lines = [
+            f"# HELP {prefix}_render_seconds Time spent rendering app sections and generating diagrams.",
+            f"# TYPE {prefix}_render_seconds summary",
+        ]
+        for name, (p50, p95, count) in sorted(summary.items()):
+            lines.append(f'{prefix}_render_seconds{{section="{name}",quantile="0.5"}} {p50:.6f}')
+            lines.append(f'{prefix}_render_seconds{{section="{name}",quantile="0.95"}} {p95:.6f}')
+            lines.append(f'{prefix}_render_seconds_sum{{section="{name}"}} {sums[name]:.6f}')
+            lines.append(f'{prefix}_render_seconds_count{{section="{name}"}} {count}')
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically replace ``path`` with the current metrics"""
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+METRICS = Metrics()
@@ -0,0 +1,87 @@
+"""Live report of the integrity problems in a ModelStore.
+
+The store itself refuses duplicate ids, unknown parents and removals that
+would leave something behind (see ``ModelStore.remove``). Problems can
+still come in through records inserted as they are: files saved before
+removal cascaded, replayed history, or relationships restored after their
+elements, or rows in storage that a lazy load brings in. ``IntegrityMonitor``
+finds those once when it is attached and then keeps the list current from
+the model's mutation and load events, looking only at the records each
+event touches, so a change costs the same whatever the size of the model.
+"""
+from c4model import KIND_LABELS, PARENT_KINDS
+
+
+class IntegrityMonitor:
+    """The current integrity violations of one model, updated on every mutation.
+
+    ``violations`` maps ``("element", id)`` or ``("relationship", id)`` to a
+    message. Only the records in memory are checked; for a lazily loaded
+    model that is everything the session has looked at.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.violations = {}
+        for element in model.elements.values():
+            self._check_element(element.id)
+        for rel_id in model.relationships:
+            self._check_relationship(rel_id)
+        model.listeners.append(self)
+
+    def __len__(self):
+        return len(self.violations)
+
+    def __call__(self, event, obj, old=None):
+        if event in ("add_element", "remove_element"):
+            self._check_element(obj.id)
+            # The element's children and relationships are the only records whose state it changes
+            for child_id in self.model.children.get(obj.id, ()):
+                self._check_element(child_id)
+            for rel_id in self.model.element_rels.get(obj.id, ()):
+                self._check_relationship(rel_id)
+        elif event in ("add_relationship", "remove_relationship"):
+            self._check_relationship(obj.id)
+        elif event == "load":
+            elements, relationships = obj
+            for element in elements:
+                self._check_element(element.id)
+            for rel in relationships:
+                self._check_relationship(rel.id)
+
+    def messages(self, limit=None):
+        """The violation messages, oldest first"""
+        messages = list(self.violations.values())
+        return messages[:limit] if limit is not None else messages
+
+    def _check_element(self, element_id):
+        model = self.model
+        element = model.elements.get(element_id)
+        key = ("element", element_id)
+        message = None
+        if element is not None and element.kind in PARENT_KINDS:
+            parent = model.elements.get(element.parent)
+            if parent is None:
+                message = f"{model.label(element_id)} belongs to '{element.parent}', which no longer exists."
+            elif parent.kind != PARENT_KINDS[element.kind]:
+                message = (f"{model.label(element_id)} belongs to {model.label(parent.id)}, not to a "
+                           f"{KIND_LABELS[PARENT_KINDS[element.kind]].lower()}.")
+        self._set(key, message)
+
+    def _check_relationship(self, rel_id):
+        model = self.model
+        rel = model.relationships.get(rel_id)
+        key = ("relationship", rel_id)
+        message = None
+        if rel is not None:
+            missing = [eid for eid in (rel.source_id, rel.target_id) if eid not in model]
+            if missing:
+                message = (f"Relationship {rel.source_id} -> {rel.target_id} ('{rel.description}') refers to "
+                           f"'{missing[0]}', which no longer exists.")
+        self._set(key, message)
+
+    def _set(self, key, message):
+        if message is None:
+            self.violations.pop(key, None)
+        else:
+            self.violations[key] = message
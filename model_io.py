@@ -0,0 +1,242 @@
+"""Bulk import and export of C4 models as JSON, JSON Lines, YAML or CSV.
+
+Every format carries the same flat records: one per element (``kind`` is
+person, system, container or component) and one per relationship (``kind``
+is relationship). CSV and JSON Lines are read and written one record at a
+time; JSON and YAML documents use the ``model_to_dict`` layout.
+"""
+import csv
+import io
+import json
+import os
+
+from c4model import KINDS, PARENT_KINDS, SYSTEM_TYPES, clean_id, element_to_record, model_to_dict, relationship_to_record
+
+FORMATS = ("json", "jsonl", "yaml", "csv")
+
+CSV_FIELDS = ("kind", "id", "parent", "name", "description", "type", "technology",
+              "source_id", "target_id")
+
+_EXTENSIONS = {
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".yaml": "yaml",
+    ".yml": "yaml",
+    ".csv": "csv",
+}
+
+
+def format_from_filename(filename):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in _EXTENSIONS:
+        raise ValueError(f"Unsupported file type '{ext}'. Use one of: {', '.join(sorted(_EXTENSIONS))}.")
+    return _EXTENSIONS[ext]
+
+
+def _import_yaml():
+    try:
+        import yaml
+    except ImportError:
+        raise ValueError("YAML support needs PyYAML; install it with 'pip install pyyaml'.") from None
+    return yaml
+
+
+def _document_records(data):
+    if not isinstance(data, dict):
+        raise ValueError("the document must be a mapping with 'elements' and 'relationships' lists")
+    # A missing or empty list, such as YAML's "elements:" with no items, has no records
+    elements = data.get("elements") or []
+    relationships = data.get("relationships") or []
+    for key, records in (("elements", elements), ("relationships", relationships)):
+        if not isinstance(records, list):
+            raise ValueError(f"'{key}' must be a list of records, not {type(records).__name__}")
+    yield from elements
+    for record in relationships:
+        # Anything but a mapping is left for plan_import to report
+        yield dict(record, kind="relationship") if isinstance(record, dict) else record
+
+
+def iter_records(text_stream, fmt):
+    """Yield raw records from a text stream in the given format"""
+    if fmt == "csv":
+        for row in csv.DictReader(text_stream):
+            yield {key: value for key, value in row.items() if value not in (None, "")}
+    elif fmt == "jsonl":
+        for line in text_stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    elif fmt == "json":
+        yield from _document_records(json.load(text_stream))
+    elif fmt == "yaml":
+        yaml = _import_yaml()
+        try:
+            data = yaml.safe_load(text_stream)
+        except yaml.YAMLError as e:
+            raise ValueError(str(e)) from None
+        yield from _document_records(data or {})
+    else:
+        raise ValueError(f"Unknown format '{fmt}'.")
+
+
+def iter_export_records(model):
+    """Yield flat records for every element and relationship, parents first"""
+    for kind in KINDS:
+        for element in model.of_kind(kind):
+            yield element_to_record(element)
+    for rel in model.all_relationships():
+        yield dict(relationship_to_record(rel), kind="relationship")
+
+
+class ImportPlan:
+    """Validated batch of elements and relationships ready to apply to a model.
+
+    Ids are derived exactly as the wizard does, checked against the target
+    model and the rest of the batch, and parents and relationship endpoints
+    are resolved, all before anything is written. ``errors`` lists every
+    problem found; a plan with errors must not be applied.
+    """
+
+    def __init__(self):
+        self.elements = {kind: [] for kind in KINDS}
+        self.relationships = []
+        self.errors = []
+
+    @property
+    def element_count(self):
+        return sum(len(records) for records in self.elements.values())
+
+    def apply(self, model):
+        """Add the whole batch to ``model``"""
+        if self.errors:
+            raise ValueError(f"Cannot apply an import with {len(self.errors)} errors.")
+        for record in self.elements["person"]:
+            model.add_person(record["name"], record["description"])
+        for record in self.elements["system"]:
+            model.add_system(record["name"], record["description"], record["type"])
+        for record in self.elements["container"]:
+            model.add_container(record["parent"], record["name"], record["description"], record["technology"])
+        for record in self.elements["component"]:
+            model.add_component(record["parent"], record["name"], record["description"], record["technology"])
+        for record in self.relationships:
+            model.add_relationship(record["source_id"], record["target_id"], record["description"])
+        return model
+
+
+def plan_import(records, model):
+    """Validate ``records`` against ``model`` and assign ids in one batch"""
+    plan = ImportPlan()
+    pending = {kind: [] for kind in KINDS}
+    pending_rels = []
+    for line, record in enumerate(records, 1):
+        if not isinstance(record, dict):
+            plan.errors.append(f"Record {line}: expected a mapping of fields, got {type(record).__name__}.")
+            continue
+        bad = [field for field, value in record.items() if isinstance(value, (dict, list))]
+        if bad:
+            plan.errors.append(f"Record {line}: field '{bad[0]}' must be a single value, not a list or mapping.")
+            continue
+        # Scalars such as YAML numbers are taken as their text; null counts as missing
+        record = {str(field): str(value) for field, value in record.items() if value is not None}
+        kind = record.get("kind", "").strip().lower()
+        if kind == "relationship":
+            pending_rels.append((line, record))
+        elif kind in pending:
+            pending[kind].append((line, record))
+        else:
+            plan.errors.append(f"Record {line}: unknown kind '{kind}'.")
+
+    # Kinds are processed top-down so every parent is known before its children
+    new_kinds = {}
+    for kind in KINDS:
+        for line, record in pending[kind]:
+            name = str(record.get("name", "")).strip()
+            description = str(record.get("description", "")).strip()
+            if not name or not description:
+                plan.errors.append(f"Record {line}: {kind} needs a name and a description.")
+                continue
+            if not clean_id(name):
+                plan.errors.append(f"Record {line}: '{name}' does not contain any letters or digits to build an id from.")
+                continue
+            if kind == "system" and (record.get("type") or "Internal") not in SYSTEM_TYPES:
+                plan.errors.append(f"Record {line}: system type must be one of {', '.join(SYSTEM_TYPES)}, "
+                                   f"got '{record['type']}'.")
+                continue
+            parent = record.get("parent") or None
+            if kind in PARENT_KINDS:
+                parent_kind = new_kinds.get(parent) or getattr(model.get(parent), "kind", None)
+                if parent_kind != PARENT_KINDS[kind]:
+                    plan.errors.append(f"Record {line}: {kind} '{name}' needs an existing {PARENT_KINDS[kind]} "
+                                       f"as parent, got '{parent}'.")
+                    continue
+                element_id = f"{parent}_{clean_id(name)}"
+            else:
+                parent = None
+                element_id = clean_id(name)
+            if record.get("id") and record["id"] != element_id:
+                plan.errors.append(f"Record {line}: id '{record['id']}' does not match '{element_id}' derived from "
+                                   f"the name.")
+                continue
+            if element_id in new_kinds or element_id in model:
+                owner = model.label(element_id) if element_id in model else "an earlier record"
+                plan.errors.append(f"Record {line}: '{name}' gets the id '{element_id}', which {owner} already has.")
+                continue
+            new_kinds[element_id] = kind
+            plan.elements[kind].append({
+                "name": name,
+                "description": description,
+                "type": record.get("type") or "Internal",
+                "technology": record.get("technology") or "",
+                "parent": parent,
+            })
+
+    for line, record in pending_rels:
+        source_id = record.get("source_id")
+        target_id = record.get("target_id")
+        description = str(record.get("description", "")).strip()
+        missing = [eid for eid in (source_id, target_id) if eid not in new_kinds and eid not in model]
+        if missing:
+            plan.errors.append(f"Record {line}: relationship refers to unknown element '{missing[0]}'.")
+        elif source_id == target_id:
+            plan.errors.append(f"Record {line}: source and target cannot be the same.")
+        elif not description:
+            plan.errors.append(f"Record {line}: relationship needs a description.")
+        else:
+            plan.relationships.append({"source_id": source_id, "target_id": target_id, "description": description})
+    return plan
+
+
+def import_stream(text_stream, fmt, model):
+    """Parse and validate a whole file; returns an ImportPlan"""
+    try:
+        return plan_import(iter_records(text_stream, fmt), model)
+    except (ValueError, csv.Error) as e:
+        plan = ImportPlan()
+        plan.errors.append(f"Could not parse the file: {e}")
+        return plan
+
+
+def export_model(model, sink, fmt):
+    """Write the model to a text sink in the given format"""
+    if fmt == "json":
+        json.dump(model_to_dict(model), sink, indent=2)
+    elif fmt == "jsonl":
+        for record in iter_export_records(model):
+            sink.write(json.dumps(record))
+            sink.write("\n")
+    elif fmt == "yaml":
+        _import_yaml().safe_dump(model_to_dict(model), sink, sort_keys=False)
+    elif fmt == "csv":
+        writer = csv.DictWriter(sink, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for record in iter_export_records(model):
+            writer.writerow(record)
+    else:
+        raise ValueError(f"Unknown format '{fmt}'.")
+
+
+def export_to_string(model, fmt):
+    sink = io.StringIO()
+    export_model(model, sink, fmt)
+    return sink.getvalue()
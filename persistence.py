@@ -0,0 +1,338 @@
+"""SQLite storage for C4 models with incremental writes and lazy loading.
+
+A ``SQLiteRepository`` holds any number of named models in one database
+file (WAL mode, pooled connections). ``open_model`` returns a ``ModelStore``
+that starts with only the persons, systems and their relationships in
+memory; containers and components are read when ``ModelStore.ensure_loaded``
+asks for them. Every add, update and remove on the store is written back as
+a single small statement, or as one transaction for a ``model.batch()``.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from c4model import KINDS, Element, IntegrityError, ModelStore, Relationship
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    name TEXT PRIMARY KEY,
+    next_rel_id INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS elements (
+    model TEXT NOT NULL,
+    id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    parent TEXT,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    type TEXT,
+    technology TEXT,
+    PRIMARY KEY (model, id)
+);
+CREATE INDEX IF NOT EXISTS elements_by_parent ON elements (model, parent);
+CREATE TABLE IF NOT EXISTS relationships (
+    model TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    source_id TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    description TEXT NOT NULL,
+    PRIMARY KEY (model, id)
+);
+CREATE INDEX IF NOT EXISTS relationships_by_source ON relationships (model, source_id);
+CREATE INDEX IF NOT EXISTS relationships_by_target ON relationships (model, target_id);
+"""
+
+_ELEMENT_COLUMNS = "id, kind, parent, name, description, type, technology"
+
+# SQLite's default limit on host parameters is 999; stay well below it
+_CHUNK = 400
+
+_KIND_ORDER = {kind: i for i, kind in enumerate(KINDS)}
+
+
+def _chunks(items, size=_CHUNK):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _element_from_row(row):
+    element_id, kind, parent, name, description, element_type, technology = row
+    return Element(element_id, kind, name, description, parent=parent, type=element_type, technology=technology)
+
+
+class ConnectionPool:
+    """Small thread-safe pool of SQLite connections to one database file"""
+
+    def __init__(self, path, size=4):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # Autocommit mode; multi-statement writes use explicit BEGIN/COMMIT
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            conn = self._connect() if create else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class SQLiteRepository:
+    """Named C4 models stored in one SQLite database"""
+
+    def __init__(self, path, pool_size=4):
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def open_model(self, name):
+        """A lazily loaded store for the named model, created if missing, that writes back every change"""
+        with self.pool.connection() as conn:
+            conn.execute("INSERT OR IGNORE INTO models (name) VALUES (?)", (name,))
+        model = ModelStore()
+        model.loader = LazyLoader(self, name)
+        model.loader.load_top_level(model)
+        model.listeners.append(ModelWriter(self, name))
+        return model
+
+    def replace_model(self, name, model):
+        """Overwrite the named model with ``model`` in one transaction and attach it"""
+        next_rel_id = max(model.relationships, default=0) + 1
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM elements WHERE model = ?", (name,))
+                conn.execute("DELETE FROM relationships WHERE model = ?", (name,))
+                conn.execute("INSERT OR REPLACE INTO models (name, next_rel_id) VALUES (?, ?)",
+                             (name, next_rel_id))
+                conn.executemany(
+                    f"INSERT INTO elements (model, {_ELEMENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((name, e.id, e.kind, e.parent, e.name, e.description, e.type, e.technology)
+                     for kind in KINDS for e in model.of_kind(kind)))
+                conn.executemany(
+                    "INSERT INTO relationships (model, id, source_id, target_id, description) VALUES (?, ?, ?, ?, ?)",
+                    ((name, r.id, r.source_id, r.target_id, r.description) for r in model.all_relationships()))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        loader = LazyLoader(self, name)
+        loader.fully_loaded = True
+        model.loader = loader
+        model.listeners[:] = [listener for listener in model.listeners if not isinstance(listener, ModelWriter)]
+        model.listeners.append(ModelWriter(self, name))
+        return model
+
+    def close(self):
+        self.pool.close()
+
+
+class LazyLoader:
+    """Fills a ModelStore from the repository one parent or subtree at a time.
+
+    Loading an element also loads its relationships. A relationship whose
+    other endpoint is not in memory yet pulls that endpoint and its parents
+    in, so the store's scope indexes stay correct for every loaded subtree.
+    """
+
+    def __init__(self, repository, model_name):
+        self.repository = repository
+        self.model_name = model_name
+        self.fully_loaded = False
+        self._children_loaded = set()
+        self._rels_loaded = set()
+
+    def next_relationship_id(self):
+        with self.repository.pool.connection() as conn:
+            (rel_id,) = conn.execute(
+                "UPDATE models SET next_rel_id = next_rel_id + 1 WHERE name = ? RETURNING next_rel_id - 1",
+                (self.model_name,)).fetchone()
+        return rel_id
+
+    def mark_new(self, element_id):
+        """Record that an element put into memory by the session has nothing stored to read"""
+        self._children_loaded.add(element_id)
+        self._rels_loaded.add(element_id)
+
+    def load_top_level(self, model):
+        with self.repository.pool.connection() as conn:
+            rows = conn.execute(f"SELECT {_ELEMENT_COLUMNS} FROM elements WHERE model = ? AND parent IS NULL "
+                                f"ORDER BY rowid", (self.model_name,)).fetchall()
+        elements = [_element_from_row(row) for row in rows]
+        elements.sort(key=lambda e: _KIND_ORDER[e.kind])
+        model.insert_loaded(elements)
+        self.load_relationships(model, [e.id for e in elements])
+
+    def load(self, model, element_id, deep=False):
+        if self.fully_loaded:
+            return
+        loaded = []
+        pending = [element_id]
+        while pending:
+            parent_id = pending.pop()
+            if parent_id not in self._children_loaded:
+                with self.repository.pool.connection() as conn:
+                    rows = conn.execute(f"SELECT {_ELEMENT_COLUMNS} FROM elements WHERE model = ? AND parent = ? "
+                                        f"ORDER BY rowid", (self.model_name, parent_id)).fetchall()
+                model.insert_loaded(_element_from_row(row) for row in rows)
+                self._children_loaded.add(parent_id)
+                # Children pulled in early through relationships go back to storage order
+                stored = dict.fromkeys(row[0] for row in rows if row[0] in model)
+                children = {**stored, **model.children.get(parent_id, {})}
+                if children:
+                    model.children[parent_id] = children
+            child_ids = list(model.children.get(parent_id, ()))
+            loaded.extend(child_ids)
+            if deep:
+                pending.extend(child_ids)
+        self.load_relationships(model, [element_id] + loaded)
+
+    def load_all(self, model):
+        if self.fully_loaded:
+            return
+        with self.repository.pool.connection() as conn:
+            rows = conn.execute(f"SELECT {_ELEMENT_COLUMNS} FROM elements WHERE model = ? ORDER BY rowid",
+                                (self.model_name,)).fetchall()
+            rel_rows = conn.execute("SELECT id, source_id, target_id, description FROM relationships "
+                                    "WHERE model = ? ORDER BY id", (self.model_name,)).fetchall()
+        elements = [_element_from_row(row) for row in rows]
+        elements.sort(key=lambda e: _KIND_ORDER[e.kind])
+        model.insert_loaded(elements, (Relationship(*row) for row in rel_rows))
+        self.fully_loaded = True
+
+    def load_relationships(self, model, element_ids):
+        if self.fully_loaded:
+            return
+        element_ids = [eid for eid in element_ids if eid not in self._rels_loaded]
+        if not element_ids:
+            return
+        rows = {}
+        with self.repository.pool.connection() as conn:
+            for chunk in _chunks(element_ids):
+                marks = ", ".join("?" * len(chunk))
+                for row in conn.execute(
+                        f"SELECT id, source_id, target_id, description FROM relationships WHERE model = ? "
+                        f"AND (source_id IN ({marks}) OR target_id IN ({marks}))",
+                        (self.model_name, *chunk, *chunk)):
+                    rows[row[0]] = row
+        rels = [Relationship(*rows[rel_id]) for rel_id in sorted(rows)]
+        self._load_elements(model, {eid for rel in rels for eid in (rel.source_id, rel.target_id)})
+        # Relationships to elements that no longer exist stay in storage only
+        model.insert_loaded(relationships=rels)
+        self._rels_loaded.update(element_ids)
+
+    def _load_elements(self, model, element_ids):
+        """Load the given elements plus any missing parents, parents first"""
+        found = []
+        missing = {eid for eid in element_ids if eid not in model}
+        while missing:
+            with self.repository.pool.connection() as conn:
+                rows = []
+                for chunk in _chunks(missing):
+                    marks = ", ".join("?" * len(chunk))
+                    rows.extend(conn.execute(f"SELECT {_ELEMENT_COLUMNS} FROM elements WHERE model = ? "
+                                             f"AND id IN ({marks})", (self.model_name, *chunk)))
+            elements = [_element_from_row(row) for row in rows]
+            found.extend(elements)
+            known = {e.id for e in found}
+            missing = {e.parent for e in elements
+                       if e.parent is not None and e.parent not in model and e.parent not in known}
+        found.sort(key=lambda e: _KIND_ORDER[e.kind])
+        model.insert_loaded(found)
+
+
+class ModelWriter:
+    """Model listener that writes each mutation to the repository.
+
+    The statements of a batch are collected and written when the store asks
+    for the commit: a lone mutation as one autocommitted statement, a
+    ``model.batch()`` as one transaction. A write the database refuses
+    raises ``IntegrityError``, and the store then rolls the batch back in
+    memory; statements of an aborted batch are dropped.
+    """
+
+    def __init__(self, repository, model_name):
+        self.repository = repository
+        self.model_name = model_name
+        # Length of ``_pending`` when each open batch began
+        self._starts = []
+        self._pending = []
+
+    def __call__(self, event, obj, old=None):
+        if event == "begin_batch":
+            self._starts.append(len(self._pending))
+        elif event == "commit_batch":
+            statements, self._pending = self._pending, []
+            if statements:
+                self._execute(statements)
+        elif event == "end_batch":
+            self._starts.pop()
+        elif event == "abort_batch":
+            del self._pending[self._starts.pop():]
+        elif event != "load":
+            self._pending.append(self._statement(event, obj))
+
+    def _statement(self, event, obj):
+        name = self.model_name
+        if event == "add_element":
+            return (f"INSERT INTO elements (model, {_ELEMENT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (name, obj.id, obj.kind, obj.parent, obj.name, obj.description, obj.type, obj.technology))
+        if event == "update_element":
+            return ("UPDATE elements SET description = ?, type = ?, technology = ? WHERE model = ? AND id = ?",
+                    (obj.description, obj.type, obj.technology, name, obj.id))
+        if event == "remove_element":
+            return "DELETE FROM elements WHERE model = ? AND id = ?", (name, obj.id)
+        if event == "add_relationship":
+            return ("INSERT INTO relationships (model, id, source_id, target_id, description) "
+                    "VALUES (?, ?, ?, ?, ?)", (name, obj.id, obj.source_id, obj.target_id, obj.description))
+        if event == "update_relationship":
+            return ("UPDATE relationships SET description = ? WHERE model = ? AND id = ?",
+                    (obj.description, name, obj.id))
+        if event == "remove_relationship":
+            return "DELETE FROM relationships WHERE model = ? AND id = ?", (name, obj.id)
+        raise ValueError(f"Unknown model event '{event}'.")
+
+    def _execute(self, statements):
+        try:
+            with self.repository.pool.connection() as conn:
+                if len(statements) == 1:
+                    conn.execute(*statements[0])
+                    return
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for sql, params in statements:
+                        conn.execute(sql, params)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.IntegrityError as e:
+            # Typically another session stored the same id first; the store rolls the change back
+            raise IntegrityError(f"The database refused the change ({e}); it may have been changed "
+                                 f"by another session.") from None
@@ -0,0 +1,285 @@
+"""Containers, components and relationships read from a Python source tree.
+
+``scan_tree`` walks a directory and parses every module with ``ast``,
+spreading the files over a process pool. Each directory holding modules is
+a package, each module a component and each import of another module in
+the tree a relationship. A root holding an ``__init__.py`` is a package
+itself, so its modules are named as the rest of the code imports them.
+``plan_scan`` turns a scan into an ``ImportPlan`` for one system, so it is
+validated and applied like any bulk import.
+
+Parse results are kept per file in a ``ScanCache``. A file whose
+modification time and size are unchanged is not read again, and one whose
+content hash is unchanged is not parsed again, so a rescan only parses the
+files that really changed.
+"""
+import ast
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from c4model import clean_id
+from model_io import plan_import
+
+CACHE_FORMAT_VERSION = 1
+
+# Below this many files to parse, starting the worker processes costs more than it saves
+PARALLEL_MIN_FILES = 32
+
+_SKIPPED_DIRS = {"__pycache__", "node_modules", "site-packages", "venv"}
+
+# Fields of statements, exception handlers and match cases that hold nested statements
+_BLOCK_FIELDS = ("body", "handlers", "cases", "orelse", "finalbody")
+
+
+class ScanCache:
+    """Parse results per file, kept in a JSON file at ``path`` if one is given
+
+    Entries are ``relative path -> [mtime_ns, size, sha256, result]``.
+    ``lock`` is held for a whole scan, so sessions scanning the same tree
+    take turns.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+            if data.get("format") == CACHE_FORMAT_VERSION:
+                self.entries = data["entries"]
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"format": CACHE_FORMAT_VERSION, "entries": self.entries}, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
+class Scan:
+    """The modules found under ``root`` and how the scan went
+
+    ``modules`` maps dotted module names to their parse results, with a
+    package's ``__init__`` under the package's own name. When the root is a
+    package, every name starts with the root directory's name. ``packages``
+    maps dotted package names, "" for a root that is not a package, to their
+    module names.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.modules = {}
+        self.packages = {}
+        self.errors = []
+        self.files = 0
+        self.parsed = 0
+        self.seconds = 0.0
+
+    @property
+    def files_per_second(self):
+        return self.files / self.seconds if self.seconds else 0.0
+
+
+def iter_source_files(root):
+    """Yield the paths of the Python files under ``root`` relative to it, in a stable order"""
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d not in _SKIPPED_DIRS)
+        for name in sorted(files):
+            if name.endswith(".py"):
+                yield os.path.relpath(os.path.join(directory, name), root)
+
+
+def scan_tree(root, cache=None, max_workers=None):
+    """Parse every Python module under ``root``, reusing ``cache`` for unchanged files"""
+    cache = cache if cache is not None else ScanCache()
+    scan = Scan(root)
+    start = time.perf_counter()
+    with cache.lock:
+        entries = {}
+        changed = []
+        for rel_path in iter_source_files(root):
+            try:
+                stat = os.stat(os.path.join(root, rel_path))
+            except OSError:
+                continue
+            entry = cache.entries.get(rel_path)
+            if entry is not None and entry[:2] == [stat.st_mtime_ns, stat.st_size]:
+                entries[rel_path] = entry
+            else:
+                changed.append((rel_path, stat, entry[2] if entry else None))
+        paths = [os.path.join(root, rel_path) for rel_path, _, _ in changed]
+        known_hashes = [digest for _, _, digest in changed]
+        for (rel_path, stat, _), (digest, result) in zip(changed, _parse_all(paths, known_hashes, max_workers)):
+            if result is None:
+                # Touched but not changed; keep the old result under the new mtime
+                result = cache.entries[rel_path][3]
+            else:
+                scan.parsed += 1
+            entries[rel_path] = [stat.st_mtime_ns, stat.st_size, digest, result]
+        cache.entries = entries
+        cache.save()
+
+    root_package = os.path.basename(os.path.abspath(root)) if "__init__.py" in entries else None
+    for rel_path, (_, _, _, result) in entries.items():
+        parts = rel_path[:-len(".py")].split(os.sep)
+        if root_package:
+            parts.insert(0, root_package)
+        if parts[-1] == "__init__":
+            parts.pop()
+            if not parts:
+                continue
+        module = ".".join(parts)
+        package = module if rel_path.endswith("__init__.py") else module.rpartition(".")[0]
+        if "error" in result:
+            scan.errors.append(f"{rel_path}: {result['error']}")
+            continue
+        scan.modules[module] = dict(result, path=rel_path, package=package)
+        scan.packages.setdefault(package, []).append(module)
+    scan.files = len(entries)
+    scan.seconds = time.perf_counter() - start
+    return scan
+
+
+def _parse_all(paths, known_hashes, max_workers):
+    if len(paths) < PARALLEL_MIN_FILES or max_workers == 1:
+        return list(map(parse_file, paths, known_hashes))
+    workers = max_workers or os.cpu_count() or 1
+    # Fresh worker processes rather than forks of a threaded server
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        return list(pool.map(parse_file, paths, known_hashes, chunksize=max(1, len(paths) // (workers * 4))))
+
+
+def parse_file(path, known_hash=None):
+    """Read one file and return ``(sha256, result)``
+
+    ``result`` is None when the content still hashes to ``known_hash``.
+    Otherwise it holds the first line of the module docstring and the
+    imports as ``[module, level, names]``, or an ``error`` message.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        return None, {"error": str(e)}
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == known_hash:
+        return digest, None
+    try:
+        tree = ast.parse(data, filename=path)
+    except (SyntaxError, ValueError) as e:
+        return digest, {"error": f"{type(e).__name__}: {e}"}
+    imports = []
+    # Imports are statements, so only statement bodies are walked, not expressions
+    stack = tree.body[::-1]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Import):
+            imports.extend([alias.name, 0, []] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            imports.append([node.module or "", node.level, [alias.name for alias in node.names]])
+        else:
+            for field in reversed(_BLOCK_FIELDS):
+                stack.extend(getattr(node, field, ())[::-1])
+    docstring = ast.get_docstring(tree) or ""
+    return digest, {"doc": docstring.strip().split("\n", 1)[0], "empty": not tree.body, "imports": imports}
+
+
+def plan_scan(scan, model, system_id):
+    """An ImportPlan adding a scan's packages, modules and imports to one system
+
+    Packages become containers of the system and modules their components;
+    an empty ``__init__`` is left out. An import becomes a relationship to
+    the module it names, or to the package when that has no module of its
+    own. Elements and relationships the model already has are skipped, so
+    scanning the same tree again only adds what is new.
+
+    Returns ``(plan, skipped)``, ``skipped`` listing the packages and
+    modules left out because their names clean to an id already taken in
+    the scan.
+    """
+    root_name = os.path.basename(os.path.abspath(scan.root)) or "root"
+    skipped = []
+    records = []
+    targets = {}
+    taken = set()
+    for package in sorted(scan.packages):
+        container_id = f"{system_id}_{clean_id(package or root_name)}"
+        if container_id in taken:
+            skipped.append(f"Package '{package}' gets the id '{container_id}' of another package; skipped.")
+            continue
+        taken.add(container_id)
+        targets[package] = container_id
+        if container_id not in model:
+            records.append({"kind": "container", "name": package or root_name, "parent": system_id,
+                            "description": f"Python package {package or root_name}", "technology": "Python"})
+        for module in scan.packages[package]:
+            info = scan.modules[module]
+            if module == package and info["empty"]:
+                continue
+            name = "__init__" if module == package else module.rpartition(".")[2]
+            component_id = f"{container_id}_{clean_id(name)}"
+            if component_id in taken:
+                skipped.append(f"Module '{module}' gets the id '{component_id}' of another module; skipped.")
+                continue
+            taken.add(component_id)
+            if module == package:
+                # The package's own module stands for the package in imports
+                targets[package] = component_id
+            targets[module] = component_id
+            if component_id not in model:
+                records.append({"kind": "component", "name": name, "parent": container_id,
+                                "description": info["doc"] or f"Python module {module}", "technology": "Python"})
+
+    for module, info in scan.modules.items():
+        source_id = targets.get(module)
+        if source_id is None:
+            continue
+        existing = {rel.target_id for rel in model.relationships_of(source_id) if rel.source_id == source_id}
+        for name in _imported_names(module, info):
+            target_id = _resolve(name, targets)
+            if target_id is None or target_id == source_id or target_id == targets[info["package"]] \
+                    or target_id in existing:
+                continue
+            existing.add(target_id)
+            records.append({"kind": "relationship", "source_id": source_id, "target_id": target_id,
+                            "description": "imports"})
+    return plan_import(records, model), skipped
+
+
+def _imported_names(module, info):
+    """Dotted names of everything a module imports, relative imports resolved"""
+    for imported, level, names in info["imports"]:
+        if level:
+            base = info["package"].split(".") if info["package"] else []
+            base = base[:len(base) - (level - 1)] if level - 1 <= len(base) else None
+            if base is None:
+                continue
+            imported = ".".join(base + ([imported] if imported else []))
+        # "from pkg import name" can name a module or an attribute; _resolve falls back to pkg for the latter
+        names = [name for name in names if name != "*"]
+        for name in names:
+            yield f"{imported}.{name}" if imported else name
+        if imported and not names:
+            yield imported
+
+
+def _resolve(name, targets):
+    """The element for the longest prefix of a dotted name that the scan knows"""
+    while name:
+        if name in targets:
+            return targets[name]
+        name = name.rpartition(".")[0]
+    return None
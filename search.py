@@ -0,0 +1,62 @@
+"""Prefix search over the element names of a C4 model"""
+import heapq
+import itertools
+import re
+from bisect import bisect_left
+
+from c4model import KINDS, clean_id
+
+_MAX_CHAR = "\U0010ffff"
+
+
+def _tokens(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+class SearchIndex:
+    """Sorted token index over element names and kinds for one model version.
+
+    Every element is indexed under the words of its name, its compacted name
+    (so "payapi" finds "Pay API"), the parts of its id (so a system's name
+    finds its containers and components) and its kind. A query matches elements that
+    have, for each query word, some token starting with that word. Build a
+    new index when ``model.version`` changes.
+    """
+
+    def __init__(self, model):
+        self.version = model.version
+        self._order = {}
+        entries = []
+        for kind in KINDS:
+            for element_id in model.by_kind[kind]:
+                self._order[element_id] = len(self._order)
+                name = model.elements[element_id].name
+                tokens = set(_tokens(name))
+                tokens.add(clean_id(name).lower())
+                tokens.update(_tokens(element_id))
+                tokens.add(kind)
+                entries.extend((token, element_id) for token in tokens)
+        entries.sort()
+        self._tokens = [token for token, _ in entries]
+        self._ids = [element_id for _, element_id in entries]
+
+    def __len__(self):
+        return len(self._order)
+
+    def _prefix_matches(self, prefix):
+        start = bisect_left(self._tokens, prefix)
+        end = bisect_left(self._tokens, prefix + _MAX_CHAR, start)
+        return set(self._ids[start:end])
+
+    def search(self, query, limit=50):
+        """Ids of the elements matching ``query``, in model order, at most ``limit``"""
+        words = _tokens(query)
+        if not words:
+            return list(itertools.islice(self._order, limit))
+        matches = None
+        for word in sorted(set(words), key=len, reverse=True):
+            found = self._prefix_matches(word)
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        return heapq.nsmallest(limit, matches, key=self._order.__getitem__)
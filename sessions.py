@@ -0,0 +1,179 @@
+"""Memory budget for the models of all sessions on one server.
+
+Each browser session keeps its model in a ``SessionSlot``. The shared
+``SessionMemoryManager`` tracks the slots in least-recently-active order;
+when the estimated size of the models in memory goes over the budget, the
+models of the idlest sessions are written to a compact file (zlib-compressed
+JSON rows) and dropped. A session gets its model back, restored from that
+file, the next time it asks for it. Models stored in a database are simply
+dropped and reopened from the database.
+"""
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from c4model import model_from_rows, model_to_rows
+from instrumentation import METRICS
+
+# Rough in-memory cost of one element and one relationship including the
+# store's indexes, measured with tracemalloc on synthetic models
+ELEMENT_BYTES = 512
+RELATIONSHIP_BYTES = 1024
+
+SPILL_FORMAT_VERSION = 1
+
+_slot_ids = itertools.count(1)
+
+
+def estimated_bytes(model):
+    return len(model.elements) * ELEMENT_BYTES + len(model.relationships) * RELATIONSHIP_BYTES
+
+
+def spill_model(model, path):
+    """Write the model to ``path`` as compressed rows, keeping relationship ids"""
+    data = dict(model_to_rows(model), format=SPILL_FORMAT_VERSION)
+    payload = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), 1)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def restore_model(path):
+    """Rebuild a model written by ``spill_model``"""
+    with open(path, "rb") as f:
+        data = json.loads(zlib.decompress(f.read()))
+    if data.get("format") != SPILL_FORMAT_VERSION:
+        raise ValueError(f"Unsupported spill format {data.get('format')!r}.")
+    return model_from_rows(data)
+
+
+class SessionSlot:
+    """Holder for one session's model; ``model`` is None while it is spilled"""
+
+    __slots__ = ("id", "model", "derived", "spill_path", "reopen", "busy", "__weakref__")
+
+    def __init__(self, model):
+        self.id = next(_slot_ids)
+        self.model = model
+        # Data built from the model (search index, ...) that is dropped on spill
+        self.derived = {}
+        self.spill_path = None
+        # (repository, model name) of a spilled model that lives in a database
+        self.reopen = None
+        # Number of script runs using the model right now; a busy slot is never spilled
+        self.busy = 0
+
+
+class SessionMemoryManager:
+    """Keeps the models of all sessions within ``budget_bytes``.
+
+    Sessions idle for less than ``min_idle`` seconds are never spilled, so a
+    model is not taken away from a script run that is still using it. Slots
+    are held weakly: when Streamlit drops a session its slot and spill file
+    go with it.
+    """
+
+    def __init__(self, budget_bytes, spill_dir=None, min_idle=30.0):
+        self.budget_bytes = budget_bytes
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="c4_sessions_")
+        self.min_idle = min_idle
+        self.spills = 0
+        self.restores = 0
+        self._lock = threading.Lock()
+        # slot id -> (weakref to slot, last active time), least recently active first
+        self._active = OrderedDict()
+
+    def model(self, slot):
+        """The slot's model, restored if it was spilled; marks the session as active"""
+        with self._lock:
+            self._active[slot.id] = (weakref.ref(slot), time.monotonic())
+            self._active.move_to_end(slot.id)
+            if slot.model is None:
+                self._restore(slot)
+            self._enforce_budget(keep=slot)
+        return slot.model
+
+    @contextmanager
+    def in_use(self, slot):
+        """Keep the slot's model in memory for the length of the block, e.g. one script run
+
+        A run can outlast ``min_idle``; spilling its model midway would lose
+        the edits it still makes to the model object it holds.
+        """
+        with self._lock:
+            slot.busy += 1
+        try:
+            yield slot
+        finally:
+            with self._lock:
+                slot.busy -= 1
+                if slot.id in self._active:
+                    # The run counts as activity until its end
+                    self._active[slot.id] = (self._active[slot.id][0], time.monotonic())
+                    self._active.move_to_end(slot.id)
+
+    def _slots(self):
+        for slot_id, (ref, _) in list(self._active.items()):
+            slot = ref()
+            if slot is None:
+                del self._active[slot_id]
+            else:
+                yield slot
+
+    def _enforce_budget(self, keep):
+        resident = [slot for slot in self._slots() if slot.model is not None]
+        total = sum(estimated_bytes(slot.model) for slot in resident)
+        now = time.monotonic()
+        for slot in resident:
+            if total <= self.budget_bytes or slot is keep:
+                break
+            if slot.busy:
+                continue
+            if now - self._active[slot.id][1] < self.min_idle:
+                # Everything after this slot was active even more recently
+                break
+            total -= estimated_bytes(slot.model)
+            self._spill(slot)
+        METRICS.set_gauge("session_resident_bytes", total)
+
+    def _spill(self, slot):
+        model = slot.model
+        if model.loader is not None:
+            slot.reopen = (model.loader.repository, model.loader.model_name)
+        else:
+            if slot.spill_path is None:
+                slot.spill_path = os.path.join(self.spill_dir, f"session_{slot.id}.c4z")
+                weakref.finalize(slot, remove_file, slot.spill_path)
+            spill_model(model, slot.spill_path)
+        slot.model = None
+        slot.derived = {}
+        self.spills += 1
+        METRICS.set_gauge("session_spills", self.spills)
+
+    def _restore(self, slot):
+        start = time.perf_counter()
+        if slot.reopen is not None:
+            repository, model_name = slot.reopen
+            slot.model = repository.open_model(model_name)
+            slot.reopen = None
+        else:
+            slot.model = restore_model(slot.spill_path)
+        self.restores += 1
+        METRICS.observe("session_restore", time.perf_counter() - start)
+        METRICS.set_gauge("session_restores", self.restores)
+
+
+def remove_file(path):
+    """Delete a file if it is still there"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,356 @@
+"""Pure-Python C4 layout and SVG rendering with a content-addressed disk cache.
+
+``render_svg`` lays out the items of a diagram (see ``diagrams``) without a
+browser: top-level elements are placed in rows by their distance from the
+persons along the relationships, and the members of each boundary are
+packed in a grid inside it. Relationships are drawn as straight arrows
+between box borders with their labels at the midpoint.
+
+``SvgCache`` stores rendered SVGs under the hash of the diagram's Mermaid
+code, which spells out everything that is drawn, so identical diagrams are
+laid out once per server and shared by every session. The cache keeps to
+a size limit by deleting the least recently used files.
+"""
+import hashlib
+import math
+import os
+import textwrap
+import threading
+from collections import OrderedDict
+from xml.sax.saxutils import escape, quoteattr
+
+
+# Bump when the drawing changes so cached SVGs are not reused
+RENDERER_VERSION = 1
+
+DEFAULT_CACHE_BYTES = 256 * 1024 ** 2
+
+NODE_WIDTH = 240
+NODE_HEIGHT = 150
+GAP = 70
+PADDING = 24
+BOUNDARY_LABEL = 36
+TITLE_HEIGHT = 50
+MAX_ROW = 6
+FONT = "Arial, Helvetica, sans-serif"
+
+_STYLES = {
+    # macro: (fill, stroke, text colour, type label)
+    "Person": ("#08427b", "#073b6f", "#ffffff", "Person"),
+    "System": ("#1168bd", "#0b4884", "#ffffff", "Software System"),
+    "System_Ext": ("#999999", "#8a8a8a", "#ffffff", "External System"),
+    "Container": ("#438dd5", "#3c7fc0", "#ffffff", "Container"),
+    "Component": ("#85bbf0", "#78a8d8", "#000000", "Component"),
+}
+
+_BOUNDARY_LABELS = {"System_Boundary": "Software System", "Container_Boundary": "Container"}
+
+
+class _Box:
+    __slots__ = ("id", "macro", "element", "technology", "children", "x", "y", "width", "height")
+
+    def __init__(self, macro, element, technology=None, children=None):
+        self.id = element.id if element is not None else None
+        self.macro = macro
+        self.element = element
+        self.technology = technology
+        self.children = children
+        self.x = self.y = 0
+        self.width = NODE_WIDTH
+        self.height = NODE_HEIGHT
+
+    def center(self):
+        return self.x + self.width / 2, self.y + self.height / 2
+
+
+def _build_tree(items):
+    """Nest the node and boundary items; returns (title, root box, relationship items)"""
+    title = ""
+    root = _Box(None, None, children=[])
+    stack = [root]
+    rels = []
+    for item in items:
+        kind = item[0]
+        if kind == "title":
+            title = item[1]
+        elif kind == "node":
+            stack[-1].children.append(_Box(item[2], item[3], item[4]))
+        elif kind == "begin":
+            box = _Box(item[2], item[3], children=[])
+            stack[-1].children.append(box)
+            stack.append(box)
+        elif kind == "end":
+            stack.pop()
+        elif kind == "rel":
+            rels.append(item)
+    return title, root, rels
+
+
+def _size_boundary(box):
+    """Size a boundary from its members, packed in a grid of about square shape"""
+    for child in box.children:
+        if child.children is not None:
+            _size_boundary(child)
+    columns = max(1, math.ceil(math.sqrt(len(box.children))))
+    rows = [box.children[i:i + columns] for i in range(0, len(box.children), columns)]
+    box.width = max([sum(c.width for c in row) + GAP * (len(row) - 1) for row in rows] + [NODE_WIDTH])
+    box.width += 2 * PADDING
+    box.height = sum(max(c.height for c in row) for row in rows) + GAP * max(0, len(rows) - 1)
+    box.height += 2 * PADDING + BOUNDARY_LABEL
+    box.children = rows
+
+
+def _place(box, x, y):
+    """Position a box and, for a boundary, its rows of members"""
+    box.x, box.y = x, y
+    if box.children is None:
+        return
+    cy = y + PADDING
+    for row in box.children:
+        cx = x + PADDING
+        for child in row:
+            _place(child, cx, cy)
+            cx += child.width + GAP
+        cy += max(child.height for child in row) + GAP
+
+
+def _rank_rows(root, rels):
+    """Rows of top-level boxes, ordered by hops from the persons along the relationships"""
+    top = {}
+    for box in root.children:
+        for box_id in _box_ids(box):
+            top[box_id] = box.id
+    adjacency = {}
+    for _, source_id, target_id, _, _ in rels:
+        source, target = top.get(source_id), top.get(target_id)
+        if source is not None and target is not None and source != target:
+            adjacency.setdefault(source, []).append(target)
+    ranks = {box.id: 0 for box in root.children if box.macro == "Person"}
+    frontier = list(ranks)
+    while frontier:
+        next_frontier = []
+        for box_id in frontier:
+            for other in adjacency.get(box_id, ()):
+                if other not in ranks:
+                    ranks[other] = ranks[box_id] + 1
+                    next_frontier.append(other)
+        frontier = next_frontier
+    unreached = max(ranks.values(), default=-1) + 1
+    layers = {}
+    for box in root.children:
+        layers.setdefault(ranks.get(box.id, unreached), []).append(box)
+    rows = []
+    for rank in sorted(layers):
+        layer = layers[rank]
+        rows.extend(layer[i:i + MAX_ROW] for i in range(0, len(layer), MAX_ROW))
+    return rows
+
+
+def _box_ids(box):
+    yield box.id
+    for row in box.children or ():
+        for child in row:
+            yield from _box_ids(child)
+
+
+def _boxes(box):
+    """Every box below ``box``, boundaries before their members"""
+    for row in box.children or ():
+        for child in row:
+            yield child
+            yield from _boxes(child)
+
+
+def _layout(root, rels):
+    """Place all boxes; returns the drawing's width and height"""
+    for box in root.children:
+        if box.children is not None:
+            _size_boundary(box)
+    rows = _rank_rows(root, rels)
+    width = max([sum(b.width for b in row) + GAP * (len(row) - 1) for row in rows] + [NODE_WIDTH])
+    y = TITLE_HEIGHT
+    for row in rows:
+        row_width = sum(b.width for b in row) + GAP * (len(row) - 1)
+        x = PADDING + (width - row_width) / 2
+        for box in row:
+            _place(box, x, y)
+            x += box.width + GAP
+        y += max(b.height for b in row) + GAP
+    root.children = rows
+    return width + 2 * PADDING, y - GAP + PADDING if rows else TITLE_HEIGHT + PADDING
+
+
+def _border_point(box, toward_x, toward_y):
+    """Where the ray from the box centre towards a point leaves the box"""
+    cx, cy = box.center()
+    dx, dy = toward_x - cx, toward_y - cy
+    if dx == 0 and dy == 0:
+        return cx, box.y + box.height
+    scale = min(box.width / 2 / abs(dx) if dx else math.inf, box.height / 2 / abs(dy) if dy else math.inf)
+    return cx + dx * scale, cy + dy * scale
+
+
+def _text(x, y, text, size, colour, weight="normal", anchor="middle", halo=False):
+    extra = ' paint-order="stroke" stroke="#ffffff" stroke-width="4"' if halo else ""
+    return (f'<text x="{x:.1f}" y="{y:.1f}" font-family={quoteattr(FONT)} font-size="{size}" '
+            f'font-weight="{weight}" fill="{colour}" text-anchor="{anchor}"{extra}>{escape(text)}</text>')
+
+
+def _shorten(text, limit):
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _node_svg(box):
+    fill, stroke, colour, type_label = _STYLES.get(box.macro, _STYLES["System"])
+    element = box.element
+    radius = 30 if box.macro == "Person" else 8
+    parts = [f'<rect x="{box.x:.1f}" y="{box.y:.1f}" width="{box.width}" height="{box.height}" rx="{radius}" '
+             f'fill="{fill}" stroke="{stroke}" stroke-width="1.5"/>']
+    cx = box.x + box.width / 2
+    parts.append(_text(cx, box.y + 30, _shorten(element.name, 28), 15, colour, "bold"))
+    label = f"[{type_label}: {box.technology}]" if box.technology else f"[{type_label}]"
+    parts.append(_text(cx, box.y + 50, _shorten(label, 36), 11, colour))
+    lines = textwrap.wrap(element.description or "", 34)
+    if len(lines) > 4:
+        lines = lines[:3] + [_shorten(" ".join(lines[3:]), 34)]
+    for i, line in enumerate(lines):
+        parts.append(_text(cx, box.y + 76 + i * 16, line, 12, colour))
+    return "".join(parts)
+
+
+def _boundary_svg(box):
+    element = box.element
+    kind = _BOUNDARY_LABELS.get(box.macro, "Boundary")
+    return (f'<rect x="{box.x:.1f}" y="{box.y:.1f}" width="{box.width}" height="{box.height}" rx="6" '
+            f'fill="none" stroke="#444444" stroke-width="1" stroke-dasharray="7,5"/>'
+            + _text(box.x + PADDING, box.y + box.height - 20, _shorten(element.name, 60), 14, "#444444", "bold",
+                    anchor="start")
+            + _text(box.x + PADDING, box.y + box.height - 6, f"[{kind}]", 11, "#444444", anchor="start"))
+
+
+def _contains(outer, inner):
+    return (outer.x <= inner.x and outer.y <= inner.y and inner.x + inner.width <= outer.x + outer.width
+            and inner.y + inner.height <= outer.y + outer.height)
+
+
+def _rel_svg(source, target, label, technology):
+    tx, ty = target.center()
+    sx, sy = source.center()
+    if _contains(target, source):
+        # To the enclosing boundary: straight down to its bottom edge
+        x1, y1 = sx, source.y + source.height
+        x2, y2 = sx, target.y + target.height
+    elif _contains(source, target):
+        x1, y1 = tx, source.y + source.height
+        x2, y2 = tx, target.y + target.height
+    else:
+        x1, y1 = _border_point(source, tx, ty)
+        x2, y2 = _border_point(target, sx, sy)
+    mx, my = (x1 + x2) / 2, (y1 + y2) / 2
+    parts = [f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}" stroke="#707070" '
+             f'stroke-width="1.2" marker-end="url(#arrow)"/>',
+             _text(mx, my, _shorten(label, 48), 12, "#333333", "bold", halo=True)]
+    if technology:
+        parts.append(_text(mx, my + 14, f"[{technology}]", 11, "#555555", halo=True))
+    return "".join(parts)
+
+
+def render_svg(items):
+    """Lay out the items of one diagram and return the SVG document as a string"""
+    title, root, rels = _build_tree(items)
+    width, height = _layout(root, rels)
+    boxes = list(_boxes(root))
+    by_id = {box.id: box for box in boxes}
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+        f'viewBox="0 0 {width:.0f} {height:.0f}">',
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="8" markerHeight="8" '
+        'orient="auto-start-reverse"><path d="M 0 0 L 10 5 L 0 10 z" fill="#707070"/></marker></defs>',
+        '<rect width="100%" height="100%" fill="#ffffff"/>',
+        _text(PADDING, 32, title, 20, "#000000", "bold", anchor="start"),
+    ]
+    for box in boxes:
+        parts.append(_boundary_svg(box) if box.children is not None else _node_svg(box))
+    for _, source_id, target_id, label, technology in rels:
+        source, target = by_id.get(source_id), by_id.get(target_id)
+        if source is not None and target is not None:
+            parts.append(_rel_svg(source, target, label, technology))
+    parts.append("</svg>\n")
+    return "\n".join(parts)
+
+
+class SvgCache:
+    """Rendered SVGs on disk, addressed by the hash of the diagram's Mermaid code.
+
+    Files are written atomically, so any number of sessions and processes
+    can share one directory. Once the files add up to more than
+    ``max_bytes``, the least recently used are deleted; a hit refreshes a
+    file's modification time, which orders the files found on startup.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # path -> size of the files this process knows of, least recently used first
+        self._files = OrderedDict()
+        self._bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        found = []
+        for subdir in os.scandir(directory):
+            if subdir.is_dir():
+                for entry in os.scandir(subdir.path):
+                    if entry.name.endswith(".svg"):
+                        stat = entry.stat()
+                        found.append((stat.st_mtime, entry.path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._files[path] = size
+            self._bytes += size
+
+    def path(self, mermaid_code):
+        digest = hashlib.sha256(f"{RENDERER_VERSION}\n{mermaid_code}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.svg")
+
+    def get(self, mermaid_code):
+        """Path of the cached SVG for this diagram, or None"""
+        path = self.path(mermaid_code)
+        try:
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            if path in self._files:
+                self._files.move_to_end(path)
+            else:
+                # Written by another process
+                self._add(path, os.path.getsize(path))
+        return path
+
+    def put(self, mermaid_code, svg):
+        path = self.path(mermaid_code)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(svg)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._add(path, os.path.getsize(path))
+            # The file just written is kept even if it alone is over the limit
+            while self._bytes > self.max_bytes and len(self._files) > 1:
+                old_path, size = self._files.popitem(last=False)
+                self._bytes -= size
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+        return path
+
+    def _add(self, path, size):
+        self._bytes += size - self._files.pop(path, 0)
+        self._files[path] = size
@@ -0,0 +1,45 @@
+"""Rollback of a failed ModelStore batch"""
+import copy
+import random
+
+import pytest
+
+from c4model import ModelStore
+
+
+def _state(model):
+    return copy.deepcopy((
+        {eid: (e.kind, e.parent, e.name, e.description, e.type, e.technology) for eid, e in model.elements.items()},
+        {rid: (r.source_id, r.target_id, r.description) for rid, r in model.relationships.items()},
+        model.children, model.element_rels, model.rollups))
+
+
+def test_failed_batch_leaves_the_model_as_it_was():
+    rng = random.Random(3)
+    model = ModelStore()
+    events = []
+    model.listeners.append(lambda event, obj, old=None: events.append(event))
+    for s in range(3):
+        system = model.add_system(f"S{s}", "d", "Internal")
+        for c in range(3):
+            model.add_container(system.id, f"C{c}", "d", "Python")
+    ids = list(model.elements)
+    for _ in range(20):
+        model.add_relationship(*rng.sample(ids, 2), "uses")
+    before = _state(model)
+    with pytest.raises(RuntimeError):
+        with model.batch():
+            model.add_container("S0", "New", "d", "Go")
+            model.add_relationship("S0_New", "S1", "calls")
+            model.update_element("S1", description="changed")
+            model.update_relationship(next(iter(model.relationships)), "changed")
+            model.remove("S2", cascade=True)
+            with model.batch():
+                model.remove_relationship(next(iter(model.relationships)))
+            raise RuntimeError("stop")
+    assert _state(model) == before
+    assert events[-1] == "abort_batch"
+    # The store is out of the batch: a later change gets a batch and a commit of its own
+    events.clear()
+    model.add_person("User", "d")
+    assert events == ["begin_batch", "add_element", "commit_batch", "end_batch"]
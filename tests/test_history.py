@@ -0,0 +1,43 @@
+"""Undo and redo of model changes"""
+import pytest
+
+from c4model import IntegrityError, ModelStore
+from history import History
+from persistence import SQLiteRepository
+
+
+def test_undo_and_redo_several_entries():
+    model = ModelStore()
+    history = History(model)
+    model.add_system("Pay", "d", "Internal")
+    with model.batch():
+        model.add_container("Pay", "Api", "d", "Python")
+        model.add_container("Pay", "Db", "d", "SQL")
+    model.add_relationship("Pay_Api", "Pay_Db", "reads")
+    model.update_element("Pay_Api", description="changed")
+    assert history.undo(3) == 3
+    assert sorted(model.elements) == ["Pay"]
+    assert not model.relationships
+    assert history.redo(2) == 2
+    assert [(r.source_id, r.target_id) for r in model.relationships.values()] == [("Pay_Api", "Pay_Db")]
+    assert model.get("Pay_Api").description == "d"
+    assert history.can_redo
+
+
+def test_refused_replay_changes_nothing(tmp_path):
+    path = tmp_path / "m.sqlite3"
+    model = SQLiteRepository(path).open_model("m")
+    history = History(model)
+    model.add_person("Admin", "d")
+    model.remove("Admin")
+    # Another session takes the id before the removal is undone
+    SQLiteRepository(path).open_model("m").add_person("Admin", "other")
+    with pytest.raises(IntegrityError):
+        history.undo(1)
+    assert "Admin" not in model
+    assert (len(history.undo_stack), len(history.redo_stack)) == (2, 0)
+    model.add_person("Clerk", "d")
+    assert len(history.undo_stack) == 3
+    stored = SQLiteRepository(path).open_model("m")
+    assert stored.get("Admin").description == "other"
+    assert "Clerk" in stored
@@ -0,0 +1,67 @@
+"""Parsing and validation of bulk imports"""
+import io
+
+import pytest
+
+from c4model import ModelStore
+from model_io import export_model, import_stream
+
+
+def _plan(text, fmt, model=None):
+    return import_stream(io.StringIO(text), fmt, model or ModelStore())
+
+
+def test_round_trip_through_every_format():
+    model = ModelStore()
+    model.add_person("User", "A user")
+    model.add_system("Shop", "The shop", "Internal")
+    model.add_container("Shop", "Api", "REST", "Python")
+    model.add_component("Shop_Api", "Orders", "Order handling", "Python")
+    model.add_relationship("User", "Shop_Api_Orders", "places orders")
+    for fmt in ("json", "jsonl", "yaml", "csv"):
+        sink = io.StringIO()
+        export_model(model, sink, fmt)
+        plan = _plan(sink.getvalue(), fmt)
+        assert not plan.errors, fmt
+        imported = plan.apply(ModelStore())
+        assert list(imported.elements) == list(model.elements), fmt
+        assert [(r.source_id, r.target_id) for r in imported.relationships.values()] == \
+            [("User", "Shop_Api_Orders")], fmt
+
+
+@pytest.mark.parametrize("text, fmt, expected", [
+    ('{"relationships": [1]}', "json", "expected a mapping"),
+    ('{"elements": 5}', "json", "'elements' must be a list"),
+    ('{"relationships": {"a": 1}}', "json", "'relationships' must be a list"),
+    ("[1, 2]", "json", "must be a mapping"),
+    ('{"kind": "system", "name": ["a"], "description": "d"}\n', "jsonl", "single value"),
+    ('"text"\n', "jsonl", "expected a mapping"),
+    ('{"kind": "system", "name": "S", "description": "d", "type": "Other"}\n', "jsonl", "Internal"),
+    ("elements:\n  - 7\n", "yaml", "expected a mapping"),
+])
+def test_malformed_input_is_reported(text, fmt, expected):
+    plan = _plan(text, fmt)
+    assert plan.errors
+    assert expected in plan.errors[0]
+
+
+@pytest.mark.parametrize("text, fmt", [
+    ('{"elements": null}', "json"),
+    ("elements:\nrelationships:\n", "yaml"),
+    ("", "yaml"),
+])
+def test_empty_lists_are_empty_imports(text, fmt):
+    plan = _plan(text, fmt)
+    assert not plan.errors
+    assert plan.element_count == 0 and not plan.relationships
+
+
+def test_ids_are_checked_against_the_model_and_the_batch():
+    model = ModelStore()
+    model.add_system("Shop", "d", "Internal")
+    plan = _plan('{"kind": "system", "name": "Shop!", "description": "d"}\n'
+                 '{"kind": "container", "name": "Api", "parent": "Shop", "description": "d"}\n'
+                 '{"kind": "container", "name": "A p i", "parent": "Shop", "description": "d"}\n'
+                 '{"kind": "component", "name": "X", "parent": "Missing", "description": "d"}\n', "jsonl", model)
+    assert len(plan.errors) == 3
+    assert "Shop" in plan.errors[0]
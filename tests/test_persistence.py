@@ -0,0 +1,101 @@
+"""Writes, lazy loading and rollback of a SQLite-backed ModelStore"""
+import pytest
+
+from c4model import IntegrityError, ModelStore
+from history import History
+from persistence import SQLiteRepository
+
+
+def _reopened(path):
+    model = SQLiteRepository(path).open_model("m")
+    model.ensure_all_loaded()
+    return model
+
+
+def _stored_model(path):
+    model = ModelStore()
+    model.add_person("User", "d")
+    model.add_system("Pay", "d", "Internal")
+    model.add_system("Bank", "d", "External")
+    model.add_container("Pay", "Api", "d", "Python")
+    model.add_container("Bank", "Core", "d", "COBOL")
+    model.add_component("Bank_Core", "Ledger", "d", "COBOL")
+    model.add_relationship("Pay_Api", "Bank_Core_Ledger", "posts")
+    repository = SQLiteRepository(path)
+    repository.replace_model("m", model)
+    return repository.open_model("m")
+
+
+def test_changes_are_written_back(tmp_path):
+    path = tmp_path / "m.sqlite3"
+    model = _stored_model(path)
+    model.add_container("Pay", "Web", "d", "JavaScript")
+    model.update_element("Pay", description="Payments")
+    model.ensure_loaded("Pay")
+    model.remove_relationship(next(iter(model.element_rels["Pay_Api"])))
+    stored = _reopened(path)
+    assert "Pay_Web" in stored
+    assert stored.get("Pay").description == "Payments"
+    assert not stored.relationships
+
+
+def test_undo_of_a_batch_created_in_the_session(tmp_path):
+    path = tmp_path / "m.sqlite3"
+    model = SQLiteRepository(path).open_model("m")
+    history = History(model)
+    model.add_system("Shop", "d", "Internal")
+    with model.batch():
+        container = model.add_container("Shop", "Api", "d", "Python")
+        a = model.add_component(container.id, "A", "d", "Python")
+        b = model.add_component(container.id, "B", "d", "Python")
+        model.add_relationship(a.id, b.id, "calls")
+    history.undo(1)
+    assert sorted(model.elements) == ["Shop"]
+    # The store is not left inside a batch, so later changes are still written
+    model.add_person("Later", "d")
+    assert sorted(_reopened(path).elements) == ["Later", "Shop"]
+
+
+def test_undo_of_several_entries(tmp_path):
+    path = tmp_path / "m.sqlite3"
+    model = _stored_model(path)
+    history = History(model)
+    model.add_person("Admin", "d")
+    model.add_relationship("Admin", "Pay", "configures")
+    history.undo(2)
+    assert "Admin" not in model
+    history.redo(2)
+    stored = _reopened(path)
+    assert "Admin" in stored
+    assert [(r.source_id, r.target_id) for r in stored.relationships_of("Admin")] == [("Admin", "Pay")]
+
+
+def test_lazy_load_does_not_bring_back_what_the_open_batch_removed(tmp_path):
+    path = tmp_path / "m.sqlite3"
+    model = _stored_model(path)
+    # Loading Pay's containers pulls the ledger in through the relationship, but not the ledger's relationships
+    model.ensure_loaded("Pay")
+    with model.batch():
+        for rel_id in list(model.element_rels["Pay_Api"]):
+            model.remove_relationship(rel_id)
+        model.remove("Bank_Core_Ledger")
+    stored = _reopened(path)
+    assert "Bank_Core_Ledger" not in stored
+    assert not stored.relationships
+
+
+def test_refused_write_is_rolled_back_in_memory(tmp_path):
+    path = tmp_path / "m.sqlite3"
+    model = _stored_model(path)
+    other = SQLiteRepository(path).open_model("m")
+    other.add_person("Auditor", "d")
+    version = model.version
+    with pytest.raises(IntegrityError):
+        with model.batch():
+            model.add_system("Audit", "d", "External")
+            model.add_person("Auditor", "d")
+    assert "Audit" not in model and "Auditor" not in model
+    assert model.version != version
+    model.add_person("Clerk", "d")
+    assert {"Auditor", "Clerk"} <= set(_reopened(path).elements)
+    assert "Audit" not in _reopened(path)
@@ -0,0 +1,84 @@
+"""The roll-up index against a brute-force recomputation after random edits"""
+import random
+
+from c4model import ModelStore, _lift, model_from_dict
+
+
+def _random_model(systems=6, containers=4, components=3):
+    model = ModelStore()
+    model.add_person("User", "A user")
+    for s in range(systems):
+        system = model.add_system(f"System {s}", "d", "Internal" if s % 3 else "External")
+        for c in range(containers):
+            container = model.add_container(system.id, f"Container {c}", "d", "Python")
+            for k in range(components):
+                model.add_component(container.id, f"Component {k}", "d", "Python")
+    return model
+
+
+def _brute_force(model, scope_id):
+    """{(source, target): rel ids} lifted to what the scope's diagram draws"""
+    scope_path = () if scope_id is None else tuple(model.ancestors(scope_id))[::-1]
+    rollups = {}
+    for rel in model.relationships.values():
+        source_path = tuple(model.ancestors(rel.source_id))[::-1]
+        target_path = tuple(model.ancestors(rel.target_id))[::-1]
+        if scope_id is not None and scope_id not in source_path and scope_id not in target_path:
+            continue
+        pair = (_lift(source_path, scope_path), _lift(target_path, scope_path))
+        if pair[0] != pair[1]:
+            rollups.setdefault(pair, set()).add(rel.id)
+    return rollups
+
+
+def _indexed(model, scope_id):
+    return {(source_id, target_id): {rel.id for rel in rels}
+            for source_id, target_id, rels in model.rolled_up_relationships(scope_id)}
+
+
+def test_rollups_match_brute_force_after_random_edits():
+    rng = random.Random(1)
+    model = _random_model()
+    ids = list(model.elements)
+    for _ in range(3000):
+        if rng.random() < 0.5 and model.relationships:
+            model.remove_relationship(rng.choice(list(model.relationships)))
+        else:
+            source_id, target_id = rng.sample(ids, 2)
+            model.add_relationship(source_id, target_id, rng.choice(["uses", "reads", "calls"]))
+    scopes = [None, *model.by_kind["system"], *model.by_kind["container"]]
+    for scope_id in scopes:
+        assert _indexed(model, scope_id) == _brute_force(model, scope_id), scope_id
+
+
+def test_removals_leave_no_empty_index_entries():
+    rng = random.Random(2)
+    model = _random_model()
+    ids = list(model.elements)
+    for _ in range(500):
+        source_id, target_id = rng.sample(ids, 2)
+        model.add_relationship(source_id, target_id, "uses")
+    for rel_id in list(model.relationships):
+        model.remove_relationship(rel_id)
+    for system_id in list(model.by_kind["system"]):
+        model.remove(system_id, cascade=True)
+    assert not model.rollups
+    assert not model.element_rels
+    assert not model.children
+
+
+def test_kept_relationships_roll_up_once_their_elements_exist():
+    model = model_from_dict({
+        "elements": [{"kind": "person", "name": "U", "description": "d"},
+                     {"kind": "system", "name": "Pay", "description": "d", "type": "Internal"},
+                     # An orphan kept from an older file; its container comes later
+                     {"kind": "component", "name": "Ledger", "parent": "Pay_Db", "description": "d"}],
+        "relationships": [{"source_id": "U", "target_id": "Pay_Api", "description": "uses"},
+                          {"source_id": "U", "target_id": "Pay_Db_Ledger", "description": "reads"}],
+    })
+    model.add_container("Pay", "Api", "d", "Python")
+    model.add_container("Pay", "Db", "d", "SQL")
+    assert _indexed(model, None) == {("U", "Pay"): {1, 2}}
+    assert _indexed(model, "Pay") == {("U", "Pay_Api"): {1}, ("U", "Pay_Db"): {2}}
+    for scope_id in (None, "Pay", "Pay_Api", "Pay_Db"):
+        assert _indexed(model, scope_id) == _brute_force(model, scope_id), scope_id
@@ -0,0 +1,83 @@
+"""Scanning a Python source tree into containers, components and relationships"""
+import os
+
+from c4model import ModelStore
+from scanner import ScanCache, plan_scan, scan_tree
+
+
+def _write(root, files):
+    for rel_path, text in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+
+def _shop(tmp_path):
+    root = tmp_path / "shop"
+    _write(root, {
+        "__init__.py": '"""The shop"""\nfrom shop import api\n',
+        "api.py": "from shop.db import models\nimport json\n",
+        "cli.py": "from . import api\nfrom .api import *\n",
+        "db/__init__.py": "",
+        "db/models.py": '"""Tables"""\nfrom ..db import session\n',
+        "db/session.py": "import sqlite3\n",
+        "broken.py": "def (:\n",
+    })
+    return root
+
+
+def _model():
+    model = ModelStore()
+    model.add_system("Shop", "d", "Internal")
+    return model
+
+
+def _edges(model):
+    return sorted((rel.source_id, rel.target_id) for rel in model.relationships.values())
+
+
+def test_package_root_and_its_imports(tmp_path):
+    scan = scan_tree(_shop(tmp_path), max_workers=1)
+    assert sorted(scan.packages) == ["shop", "shop.db"]
+    assert [error.split(":")[0] for error in scan.errors] == ["broken.py"]
+    model = _model()
+    plan, skipped = plan_scan(scan, model, "Shop")
+    assert not plan.errors and not skipped
+    plan.apply(model)
+    assert sorted(model.children["Shop"]) == ["Shop_shop", "Shop_shopdb"]
+    # The empty db/__init__.py is left out; the root's own __init__ is a component
+    assert sorted(model.children["Shop_shopdb"]) == ["Shop_shopdb_models", "Shop_shopdb_session"]
+    assert model.get("Shop_shopdb_models").description == "Tables"
+    assert _edges(model) == [
+        ("Shop_shop_api", "Shop_shopdb_models"),
+        ("Shop_shop_cli", "Shop_shop_api"),
+        ("Shop_shop_init", "Shop_shop_api"),
+        ("Shop_shopdb_models", "Shop_shopdb_session"),
+    ]
+    plan, _ = plan_scan(scan_tree(scan.root, max_workers=1), model, "Shop")
+    assert plan.element_count == 0 and not plan.relationships
+
+
+def test_colliding_names_are_returned_as_skipped(tmp_path):
+    _write(tmp_path / "tools", {"a_b.py": "import ab\n", "ab.py": ""})
+    scan = scan_tree(tmp_path / "tools", max_workers=1)
+    plan, skipped = plan_scan(scan, _model(), "Shop")
+    assert skipped == ["Module 'ab' gets the id 'Shop_tools_ab' of another module; skipped."]
+    assert not scan.errors
+    assert plan.element_count == 2
+
+
+def test_cache_parses_only_changed_files(tmp_path):
+    root = _shop(tmp_path)
+    cache = ScanCache(str(tmp_path / "cache.json"))
+    assert scan_tree(root, cache, max_workers=1).parsed == 7
+    cache = ScanCache(str(tmp_path / "cache.json"))
+    assert scan_tree(root, cache, max_workers=1).parsed == 0
+    api = root / "api.py"
+    stat = api.stat()
+    os.utime(api, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert scan_tree(root, cache, max_workers=1).parsed == 0
+    api.write_text("import csv\n")
+    scan = scan_tree(root, cache, max_workers=1)
+    assert scan.parsed == 1
+    assert scan.modules["shop.api"]["imports"] == [["csv", 0, []]]